@@ -0,0 +1,148 @@
+# kg/async_fetch.py
+"""
+Concurrent source fetcher for dynamic_kg.
+
+All sources in dynamic_kg.SOURCES are requested at the same time on one
+aiohttp session with keep-alive connections, so a warm process reuses its
+TCP/TLS connections to each host. The session lives on a background event
+loop thread, which lets the synchronous KG code (and serve.py's executor
+threads) call fetch_all() without owning a loop. A call returns after at
+most `deadline` seconds with whatever sources finished; the rest are "".
+Article pages are revalidated against http_cache (If-None-Match /
+If-Modified-Since), so an unchanged page costs a 304.
+"""
+import asyncio
+import atexit
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Optional, Tuple
+
+import aiohttp
+
+import dynamic_kg
+from http_cache import HTTP_CACHE, CachedPage
+
+REQUEST_TIMEOUT_S = 8.0      # per HTTP request, as in the blocking scrapers
+POOL_SIZE = 32               # open connections in total
+POOL_SIZE_PER_HOST = 4
+KEEPALIVE_S = 60.0
+
+
+class AsyncFetcher:
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="kg-fetch", daemon=True)
+        self._thread.start()
+        self._session: Optional[aiohttp.ClientSession] = self._run(self._open()).result()
+        self.stats = {"requests": 0, "errors": 0, "timeouts": 0}
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _open(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_SIZE,
+            limit_per_host=POOL_SIZE_PER_HOST,
+            keepalive_timeout=KEEPALIVE_S,
+            ttl_dns_cache=300,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers=dynamic_kg.UA,
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_S),
+        )
+
+    async def _get(self, url: str) -> Optional[str]:
+        self.stats["requests"] += 1
+        async with self._session.get(url) as resp:
+            if resp.status != 200:
+                return None
+            return await resp.text(errors="replace")
+
+    async def _get_cached(self, url: str) -> Optional[CachedPage]:
+        """Conditional GET; the (larger) body write happens in an executor thread."""
+        loop = asyncio.get_running_loop()
+        headers = HTTP_CACHE.revalidation_headers(url)  # one small JSON read
+        self.stats["requests"] += 1
+        async with self._session.get(url, headers=headers) as resp:
+            text = await resp.text(errors="replace") if resp.status == 200 else None
+            return await loop.run_in_executor(
+                None, HTTP_CACHE.update, url, resp.status, text, resp.headers
+            )
+
+    async def _source(self, source: str, condition: str) -> Tuple[str, Optional[tuple]]:
+        """(text, (url, sha256) of the cached page or None)."""
+        loop = asyncio.get_running_loop()
+        try:
+            url = dynamic_kg.source_url(source, condition)
+            if dynamic_kg.SOURCES[source]["follow"] is not None:
+                html = await self._get(url)
+                if html is None:
+                    return "", None
+                url = await loop.run_in_executor(None, dynamic_kg.first_link, html, source)
+                if not url:
+                    return "", None
+            page = await self._get_cached(url)
+            if page is None:
+                return "", None
+            # HTML parsing is CPU work: keep it off the event loop
+            return await loop.run_in_executor(None, dynamic_kg.page_text, page.text), (url, page.sha256)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            return "", None
+
+    async def _fetch_all(self, condition: str, deadline: float) -> "dynamic_kg.SourceTexts":
+        tasks = {
+            source: asyncio.ensure_future(self._source(source, condition))
+            for source in dynamic_kg.SOURCES
+        }
+        done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+        for task in pending:
+            task.cancel()
+        self.stats["timeouts"] += len(pending)
+        pages = {
+            source: task.result() if task in done else ("", None)
+            for source, task in tasks.items()
+        }
+        return dynamic_kg.SourceTexts(
+            {source: text for source, (text, _) in pages.items()},
+            {source: page for source, (_, page) in pages.items() if page},
+        )
+
+    def fetch_all(self, condition: str, deadline: float) -> "dynamic_kg.SourceTexts":
+        """Blocking entry point; safe to call from any thread but the fetcher's own."""
+        future = self._run(self._fetch_all(condition, deadline))
+        try:
+            # small grace period for cancellation to finish after the deadline
+            return future.result(timeout=deadline + 1.0)
+        except FutureTimeout:
+            future.cancel()
+            return dynamic_kg.SourceTexts({source: "" for source in dynamic_kg.SOURCES})
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._run(self._session.close()).result(timeout=5)
+            self._session = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_FETCHER: Optional[AsyncFetcher] = None
+_FETCHER_LOCK = threading.Lock()
+
+
+def get_fetcher() -> AsyncFetcher:
+    global _FETCHER
+    if _FETCHER is None:
+        with _FETCHER_LOCK:
+            if _FETCHER is None:
+                _FETCHER = AsyncFetcher()
+                atexit.register(_FETCHER.close)
+    return _FETCHER
+
+
+def fetch_all(condition: str, deadline: float = None) -> "dynamic_kg.SourceTexts":
+    """dynamic_kg.fetch_text_from_sources, concurrently and under a deadline."""
+    return get_fetcher().fetch_all(condition, dynamic_kg.FETCH_DEADLINE_S if deadline is None else deadline)
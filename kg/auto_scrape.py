@@ -1,9 +1,13 @@
 # kg/auto_scrape.py
 
-import requests
 from bs4 import BeautifulSoup
 import re
 
+try:
+    from http_cache import HTTP_CACHE
+except ImportError:  # imported as kg.auto_scrape
+    from kg.http_cache import HTTP_CACHE
+
 HEADERS = {"User-Agent": "Mozilla/5.0"}
 
 INVALID_PATTERNS = [
@@ -57,7 +61,14 @@ def looks_like_symptom(text):
 
 def extract_bullet_list(url):
     try:
-        page = requests.get(url, headers=HEADERS, timeout=10)
+        page = HTTP_CACHE.get(url, headers=HEADERS, timeout=10)
+        if page is None:
+            return []
+        if not page.changed:
+            cached = HTTP_CACHE.derived(url, "bullets")
+            if cached is not None:
+                return cached  # same page as last time: skip parsing
+
         soup = BeautifulSoup(page.text, "html.parser")
 
         symptoms = []
@@ -66,6 +77,7 @@ def extract_bullet_list(url):
             if looks_like_symptom(text):
                 symptoms.append(text)
 
+        HTTP_CACHE.set_derived(url, "bullets", symptoms)
         return symptoms
     except:
         return []
@@ -0,0 +1,329 @@
+# kg/bulk_builder.py
+"""
+Bulk KG builder: scrape a whole catalog of conditions in one run.
+
+    python kg/bulk_builder.py conditions.txt --per-host 4 --rate 2 [--refresh]
+
+Conditions (one per line) are crawled concurrently from every source in
+dynamic_kg.SOURCES. Each host gets at most `per_host` requests in flight and
+at most `rate` request starts per second, so a large catalog does not hammer
+any one site. Article pages are revalidated through http_cache, so a refresh
+of an unchanged catalog costs mostly 304s.
+
+Every finished condition is appended to a JSONL checkpoint, and a rerun after
+an interruption skips the conditions already in it. When the crawl is done,
+all results go into the KG in one batched commit
+(dynamic_kg.write_conditions), unchanged conditions getting a new
+last_updated, and the checkpoint is removed.
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import dynamic_kg
+from http_cache import HTTP_CACHE, CachedPage
+
+PER_HOST = 4                  # requests in flight per host
+RATE = 2.0                    # request starts per second per host (0 = no limit)
+CONDITIONS_IN_FLIGHT = 32
+REQUEST_TIMEOUT_S = 15.0
+RETRIES = 2                   # after connection errors, timeouts, 429 and 5xx
+BACKOFF_S = 1.0               # doubled on each retry
+CHECKPOINT = dynamic_kg.KG_DIR / "bulk_build.checkpoint.jsonl"
+PROGRESS_EVERY = 50
+
+# checkpoint statuses that count as finished on resume ("failed" is retried)
+DONE = ("ok", "empty", "unchanged", "exists")
+
+
+def _cond_id(condition: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]", "", condition.title())
+
+
+def read_conditions(path: str) -> List[str]:
+    """One condition per line; blank lines, "#" comments and duplicates dropped."""
+    with open(path, encoding="utf-8") as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return list(dict.fromkeys(line for line in lines if line))
+
+
+def load_checkpoint(path: Path) -> Dict[str, dict]:
+    """condition -> last record for it; a torn last line (crash mid-write) is ignored."""
+    records = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                records[rec["condition"]] = rec
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class HostLimiter:
+    """At most `concurrency` requests in flight and `rate` starts per second."""
+
+    def __init__(self, concurrency: int, rate: float):
+        self._sem = asyncio.Semaphore(concurrency)
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def __aenter__(self):
+        await self._sem.acquire()
+        try:
+            if self._interval:
+                now = asyncio.get_running_loop().time()
+                start = max(now, self._next)
+                self._next = start + self._interval  # reserve the slot before sleeping
+                if start > now:
+                    await asyncio.sleep(start - now)
+        except BaseException:
+            self._sem.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self._sem.release()
+
+
+class BulkBuilder:
+    def __init__(
+        self,
+        per_host: int = PER_HOST,
+        rate: float = RATE,
+        in_flight: int = CONDITIONS_IN_FLIGHT,
+        checkpoint: Path = CHECKPOINT,
+        refresh: bool = False,
+    ):
+        self.per_host = per_host
+        self.rate = rate
+        self.in_flight = in_flight
+        self.checkpoint = Path(checkpoint)
+        self.refresh = refresh
+        self.hosts: Dict[str, dict] = defaultdict(
+            lambda: {"requests": 0, "ok": 0, "not_modified": 0, "retries": 0, "failed": 0, "bytes": 0}
+        )
+        self.records: Dict[str, dict] = {}
+        self.resumed = 0
+        self.written = 0
+        self.elapsed = 0.0
+        self._limiters: Dict[str, HostLimiter] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    # --------------------
+    #   HTTP
+    # --------------------
+    def _limiter(self, host: str) -> HostLimiter:
+        if host not in self._limiters:
+            self._limiters[host] = HostLimiter(self.per_host, self.rate)
+        return self._limiters[host]
+
+    async def _attempt(self, url: str, headers: dict, stats: dict):
+        """(status, text, headers), or None if the request should be retried."""
+        async with self._limiter(urlsplit(url).netloc):
+            stats["requests"] += 1
+            try:
+                async with self._session.get(url, headers=headers) as resp:
+                    if resp.status == 429 or resp.status >= 500:
+                        return None
+                    text = await resp.text(errors="replace") if resp.status == 200 else None
+                    return resp.status, text, resp.headers
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return None
+
+    async def _get(self, url: str, conditional: bool) -> Optional[CachedPage]:
+        """GET under the host's limits; article pages (conditional) go through http_cache."""
+        stats = self.hosts[urlsplit(url).netloc]
+        headers = HTTP_CACHE.revalidation_headers(url) if conditional else {}
+        result = None
+        for attempt in range(RETRIES + 1):
+            if attempt:
+                stats["retries"] += 1
+                await asyncio.sleep(BACKOFF_S * 2 ** (attempt - 1))
+            result = await self._attempt(url, headers, stats)
+            if result is not None:
+                break
+
+        if result is None or result[0] not in (200, 304):
+            stats["failed"] += 1
+            return None
+        status, text, resp_headers = result
+        if conditional:
+            loop = asyncio.get_running_loop()
+            page = await loop.run_in_executor(None, HTTP_CACHE.update, url, status, text, resp_headers)
+        else:
+            page = CachedPage(text, True, status) if status == 200 else None
+        if page is None:
+            stats["failed"] += 1  # 304 for a page we have no body for
+            return None
+        stats["ok" if status == 200 else "not_modified"] += 1
+        stats["bytes"] += len(text or "")
+        return page
+
+    async def _source(self, source: str, condition: str):
+        """(text, (url, sha256) of the cached page) for one source, or None if a request failed."""
+        url = dynamic_kg.source_url(source, condition)
+        loop = asyncio.get_running_loop()
+        if dynamic_kg.SOURCES[source]["follow"] is not None:
+            search = await self._get(url, conditional=False)
+            if search is None:
+                return None
+            url = await loop.run_in_executor(None, dynamic_kg.first_link, search.text, source)
+            if not url:
+                return "", None  # no search result: nothing to scrape, not a failure
+        page = await self._get(url, conditional=True)
+        if page is None:
+            return None
+        return await loop.run_in_executor(None, dynamic_kg.page_text, page.text), (url, page.sha256)
+
+    # --------------------
+    #   CRAWL
+    # --------------------
+    async def _condition(self, condition: str) -> dict:
+        sources = list(dynamic_kg.SOURCES)
+        pages = await asyncio.gather(*(self._source(s, condition) for s in sources))
+        record = {"condition": condition, "failed_sources": [s for s, p in zip(sources, pages) if p is None]}
+        if len(record["failed_sources"]) == len(sources):
+            return {**record, "status": "failed"}
+
+        got = {s: p for s, p in zip(sources, pages) if p is not None}
+        texts = dynamic_kg.SourceTexts(
+            {s: text for s, (text, _) in got.items()},
+            {s: page for s, (text, page) in got.items() if text and page},
+        )
+        if self.refresh and texts.unchanged:
+            return {**record, "status": "unchanged"}
+        symptoms = dynamic_kg.extract_common_symptoms(texts)
+        return {**record, "status": "ok" if symptoms else "empty", "symptoms": symptoms, "pages": texts.pages}
+
+    async def _crawl(self, conditions: List[str]) -> None:
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.per_host, ttl_dns_cache=300)
+        gate = asyncio.Semaphore(self.in_flight)
+        finished = 0
+
+        with open(self.checkpoint, "a", encoding="utf-8") as log:
+            async def one(condition: str) -> None:
+                nonlocal finished
+                async with gate:
+                    record = await self._condition(condition)
+                self.records[condition] = record
+                log.write(json.dumps(record, ensure_ascii=False) + "\n")
+                log.flush()
+                finished += 1
+                if finished % PROGRESS_EVERY == 0:
+                    print(f"[BULK] {finished}/{len(conditions)} conditions crawled")
+
+            async with aiohttp.ClientSession(
+                connector=connector,
+                headers=dynamic_kg.UA,
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_S),
+            ) as self._session:
+                await asyncio.gather(*(one(c) for c in conditions))
+        self._session = None
+
+    def crawl(self, conditions: Iterable[str]) -> Dict[str, dict]:
+        """
+        Crawl every condition not finished in the checkpoint (and, unless
+        refreshing, not already in the KG). Results are checkpointed but not
+        written to the KG.
+        """
+        conditions = list(dict.fromkeys(conditions))
+        done = load_checkpoint(self.checkpoint)
+        g = dynamic_kg.load_graph()
+
+        todo = []
+        for condition in conditions:
+            record = done.get(condition)
+            if record is not None and record["status"] in DONE:
+                self.records[condition] = record
+                self.resumed += 1
+            elif not self.refresh and dynamic_kg.get_symptoms(g, _cond_id(condition)):
+                self.records[condition] = {"condition": condition, "status": "exists"}
+            else:
+                todo.append(condition)
+        if self.resumed:
+            print(f"[BULK] resuming: {self.resumed} conditions already in {self.checkpoint}")
+
+        self.checkpoint.parent.mkdir(parents=True, exist_ok=True)
+        t0 = time.perf_counter()
+        try:
+            asyncio.run(self._crawl(todo))
+        finally:
+            self.elapsed += time.perf_counter() - t0
+        return {c: self.records[c] for c in conditions if c in self.records}
+
+    def build(self, conditions: Iterable[str]) -> int:
+        """
+        crawl(), then write every scraped condition in one KG commit; unchanged
+        ones (refresh) just get a new last_updated in the same commit.
+        """
+        records = self.crawl(conditions)
+        batch = [(c, r["symptoms"]) for c, r in records.items() if r["status"] == "ok"]
+        unchanged = [c for c, r in records.items() if r["status"] == "unchanged"]
+        self.written = dynamic_kg.write_conditions(batch, refresh=self.refresh, touch=unchanged)
+        for record in records.values():
+            if record["status"] == "ok":  # the KG now reflects these page versions
+                for url, sha256 in record.get("pages", {}).values():
+                    HTTP_CACHE.mark_used(url, sha256, dynamic_kg.KG_MARK)
+        self.checkpoint.unlink(missing_ok=True)  # committed; a rerun starts fresh
+        return self.written
+
+    # --------------------
+    #   REPORT
+    # --------------------
+    def report(self) -> None:
+        counts = defaultdict(int)
+        for record in self.records.values():
+            counts[record["status"]] += 1
+        elapsed = max(self.elapsed, 1e-9)
+        crawled = len(self.records) - self.resumed - counts.get("exists", 0)
+        print(
+            f"[BULK] {len(self.records)} conditions ({crawled} crawled in {self.elapsed:.1f}s, "
+            f"{crawled / elapsed:.1f}/s): "
+            + ", ".join(f"{status}={n}" for status, n in sorted(counts.items()))
+            + f"; {self.written} written to the KG in one commit"
+            + (f" ({counts['unchanged']} unchanged marked up to date)" if counts.get("unchanged") else "")
+        )
+        for host, s in sorted(self.hosts.items()):
+            print(
+                f"[BULK]   {host:<32} {s['requests']:>6} req  {s['requests'] / elapsed:6.1f} req/s  "
+                f"200={s['ok']} 304={s['not_modified']} retries={s['retries']} failed={s['failed']} "
+                f"{s['bytes'] / 1e6:.1f} MB"
+            )
+        failed = [c for c, r in self.records.items() if r["status"] == "failed"]
+        if failed:
+            print(f"[BULK] failed ({len(failed)}): {', '.join(failed[:10])}{' ...' if len(failed) > 10 else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape a list of conditions into the KG")
+    parser.add_argument("conditions", help="text file, one condition per line")
+    parser.add_argument("--refresh", action="store_true", help="re-scrape conditions already in the KG")
+    parser.add_argument("--per-host", type=int, default=PER_HOST, help="requests in flight per host")
+    parser.add_argument("--rate", type=float, default=RATE, help="requests per second per host (0 = no limit)")
+    parser.add_argument("--in-flight", type=int, default=CONDITIONS_IN_FLIGHT, help="conditions crawled at once")
+    parser.add_argument("--checkpoint", default=str(CHECKPOINT))
+    args = parser.parse_args()
+
+    builder = BulkBuilder(args.per_host, args.rate, args.in_flight, Path(args.checkpoint), args.refresh)
+    try:
+        builder.build(read_conditions(args.conditions))
+    except KeyboardInterrupt:
+        print(f"[BULK] interrupted; rerun the same command to resume from {builder.checkpoint}")
+    finally:
+        builder.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# kg/bulk_detector.py
+"""
+Bulk disorder screening: detect_disorders_from_text for many texts at once.
+
+The KG becomes a binary condition x symptom CSR matrix and the texts a
+binary text x symptom CSR matrix, so every overlap count comes out of one
+sparse product. Top-k per text is picked with NumPy argpartition. Results
+(scores and tie order) are the same as detect_disorders_from_text.
+
+    python kg/bulk_detector.py chats.txt --out matches.jsonl --top-k 3
+
+The input has one message per line (.txt) or a "text" field per line (.jsonl).
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import weakref
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from rdflib import Graph
+from scipy import sparse
+
+from disorder_detector import SymptomIndex, get_symptom_index
+from dynamic_kg import load_graph
+from symptom_extractor import extract_symptoms_batch
+
+CHUNK_SIZE = 10_000  # texts scored per sparse product
+
+
+class ConditionMatrix:
+    """CSR view of a SymptomIndex (rows follow the index's condition order)."""
+
+    def __init__(self, index: SymptomIndex):
+        self.cond_ids = list(index.labels)
+        self.labels = [index.labels[c] for c in self.cond_ids]
+        self.vocab: Dict[str, int] = {s: j for j, s in enumerate(index.postings)}
+
+        row_of = {c: i for i, c in enumerate(self.cond_ids)}
+        rows, cols = [], []
+        for s, conds in index.postings.items():
+            for c in conds:
+                rows.append(row_of[c])
+                cols.append(self.vocab[s])
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(self.cond_ids), len(self.vocab)),
+        )
+        self.counts = np.asarray([index.counts[c] for c in self.cond_ids], dtype=np.float64)
+
+    def user_matrix(self, symptom_lists: List[List[str]]) -> sparse.csr_matrix:
+        indptr, indices = [0], []
+        for symptoms in symptom_lists:
+            cols = {self.vocab[s] for s in symptoms if s in self.vocab}
+            indices.extend(sorted(cols))
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr),
+            shape=(len(symptom_lists), len(self.vocab)),
+        )
+
+    def top_k(self, symptom_lists: List[List[str]], k: int) -> List[List[Dict[str, object]]]:
+        n_cond = len(self.cond_ids)
+        if n_cond == 0 or k <= 0:
+            return [[] for _ in symptom_lists]
+
+        # texts x conditions overlap counts; stays sparse, only shared symptoms are stored
+        overlap = (self.user_matrix(symptom_lists) @ self.matrix.T).tocsr()
+        overlap.eliminate_zeros()
+        overlap.sort_indices()
+        cols = overlap.indices
+        rows = np.repeat(np.arange(overlap.shape[0]), np.diff(overlap.indptr))
+        # rounded to 0.1 % like the single-text path, kept as integer tenths
+        scores = overlap.data.astype(np.float64) / self.counts[cols]
+        tenths = np.rint(np.round(scores * 100.0, 1) * 10.0).astype(np.int64)
+        # per text: higher score first, then earlier condition first
+        order = np.lexsort((cols, -tenths, rows))
+
+        results = []
+        for r in range(overlap.shape[0]):
+            start = overlap.indptr[r]
+            top = order[start:min(start + k, overlap.indptr[r + 1])]
+            results.append([
+                {"label": self.labels[c], "score": t / 10.0}
+                for c, t in zip(cols[top], tenths[top])
+            ])
+        return results
+
+
+# SymptomIndex -> ConditionMatrix; the index itself is rebuilt on KG changes
+_MATRICES: "weakref.WeakKeyDictionary[SymptomIndex, ConditionMatrix]" = weakref.WeakKeyDictionary()
+_MATRIX_LOCK = threading.Lock()
+
+
+def get_condition_matrix(g: Graph) -> ConditionMatrix:
+    index = get_symptom_index(g)
+    with _MATRIX_LOCK:
+        matrix = _MATRICES.get(index)
+        if matrix is None:
+            matrix = _MATRICES[index] = ConditionMatrix(index)
+    return matrix
+
+
+def detect_disorders_batch(
+    texts: List[str],
+    g: Graph,
+    max_results: int = 3,
+    symptoms: Optional[List[List[str]]] = None,
+) -> List[Dict[str, object]]:
+    """detect_disorders_from_text for every text; same result dicts."""
+    matrix = get_condition_matrix(g)
+    symptom_lists = symptoms if symptoms is not None else extract_symptoms_batch(texts)
+
+    out = []
+    for i in range(0, len(symptom_lists), CHUNK_SIZE):
+        chunk = symptom_lists[i:i + CHUNK_SIZE]
+        for user_symptoms, matches in zip(chunk, matrix.top_k(chunk, max_results)):
+            if not user_symptoms:
+                out.append({"symptoms": [], "matches": []})
+            else:
+                out.append({"symptoms": user_symptoms, "matches": matches})
+    return out
+
+
+def _read_texts(path: str) -> Iterator[str]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            yield json.loads(line)["text"] if path.endswith(".jsonl") else line
+
+
+def _chunks(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen many texts against the KG")
+    parser.add_argument("input", help=".txt (one message per line) or .jsonl with a 'text' field")
+    parser.add_argument("--out", default=None, help="write JSON lines here instead of stdout")
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    g = load_graph()
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+    total = flagged = 0
+    t0 = time.perf_counter()
+    try:
+        for chunk in _chunks(_read_texts(args.input), CHUNK_SIZE):
+            for text, result in zip(chunk, detect_disorders_batch(chunk, g, args.top_k)):
+                total += 1
+                flagged += bool(result["matches"])
+                line = json.dumps({"text": text, **result}, ensure_ascii=False)
+                if out:
+                    out.write(line + "\n")
+                else:
+                    print(line)
+    finally:
+        if out:
+            out.close()
+
+    elapsed = time.perf_counter() - t0
+    print(
+        f"[BULK] {total} texts, {flagged} with matches, "
+        f"{elapsed:.2f}s ({total / max(elapsed, 1e-9):.0f} texts/s)",
+        file=sys.stderr,  # stdout may be the JSONL stream
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,100 @@
-from typing import List, Dict, Tuple
+import threading
+import weakref
+from collections import Counter
+from typing import List, Dict, Optional, Tuple
 from rdflib import Graph
-from dynamic_kg import load_graph, get_symptoms
+from rdflib.plugins.sparql import prepareQuery
+from dynamic_kg import kg_version
 from symptom_extractor import extract_symptoms_from_text
 
-def _get_conditions(g: Graph) -> List[Tuple[str, str]]:
-    """
-    Returns list of (cond_id, label) from KG.
-    cond_id is the local name after '#'.
-    """
-    q = """
+# prepared once (see dynamic_kg.SYMPTOMS_QUERY)
+INDEX_QUERY = prepareQuery("""
     PREFIX mh: <http://example.org/mentalhealth#>
-    SELECT ?cond ?label WHERE {
+    SELECT ?cond ?label ?slabel WHERE {
         ?cond a mh:Condition .
         ?cond mh:label ?label .
+        ?cond mh:associated_with ?symptom .
+        ?symptom mh:label ?slabel .
     }
+    """)
+
+
+class SymptomIndex:
+    """
+    Inverted index over the KG, built with one SPARQL query:
+    - labels:   cond_id -> label, in query order (ties keep this order)
+    - counts:   cond_id -> number of distinct (lowercased) symptoms
+    - postings: symptom label (lowercased) -> [cond_id, ...]
     """
-    rows = list(g.query(q))
-    result = []
-    for uri, label in rows:
-        uri_str = str(uri)
-        cond_id = uri_str.split("#")[-1]
-        result.append((cond_id, str(label)))
-    return result
+
+    def __init__(self, g: Graph):
+        self.labels: Dict[str, str] = {}
+        symptoms: Dict[str, set] = {}
+        for uri, label, slabel in g.query(INDEX_QUERY):
+            cond_id = str(uri).split("#")[-1]
+            self.labels.setdefault(cond_id, str(label))
+            symptoms.setdefault(cond_id, set()).add(str(slabel).lower())
+
+        self.order = {cond_id: i for i, cond_id in enumerate(self.labels)}
+        self.counts = {cond_id: len(s) for cond_id, s in symptoms.items()}
+        self.postings: Dict[str, List[str]] = {}
+        for cond_id, cond_symptoms in symptoms.items():
+            for s in cond_symptoms:
+                self.postings.setdefault(s, []).append(cond_id)
+
+    def score(self, user_symptoms: List[str]) -> List[Dict[str, object]]:
+        """Overlap scores for the conditions sharing at least one symptom."""
+        hits = Counter()
+        for s in set(user_symptoms):
+            for cond_id in self.postings.get(s, ()):
+                hits[cond_id] += 1
+
+        # Simple score: proportion of condition's symptoms matched, scaled to %
+        scores = {c: round((n / self.counts[c]) * 100.0, 1) for c, n in hits.items()}
+        ranked = sorted(scores, key=lambda c: (-scores[c], self.order[c]))
+        return [{"label": self.labels[c], "score": scores[c]} for c in ranked]
+
+
+# graph -> ((len, kg_version), SymptomIndex); dropped with the graph
+_INDEXES: "weakref.WeakKeyDictionary[Graph, Tuple[Tuple[int, int], SymptomIndex]]" = (
+    weakref.WeakKeyDictionary()
+)
+_INDEX_LOCK = threading.Lock()
+
+
+def get_symptom_index(g: Graph) -> SymptomIndex:
+    """Cached SymptomIndex for g; rebuilt when the graph changed."""
+    stamp = (len(g), kg_version())
+    with _INDEX_LOCK:
+        cached = _INDEXES.get(g)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    index = SymptomIndex(g)
+    with _INDEX_LOCK:
+        _INDEXES[g] = (stamp, index)
+    return index
 
 
 def detect_disorders_from_text(
     text: str,
     g: Graph,
-    max_results: int = 3
+    max_results: int = 3,
+    symptoms: Optional[List[str]] = None,
 ) -> Dict[str, object]:
     """
     Given user text and a KG, extract user symptoms and match them
     against each condition in the KG. Returns dict with:
     - 'symptoms': list of user symptoms
     - 'matches': list of { 'label': str, 'score': float } sorted by score desc
+    Pass symptoms when they were already extracted (e.g. by the intent
+    router) to skip rescanning the text.
     """
-    user_symptoms = extract_symptoms_from_text(text)
+    user_symptoms = symptoms if symptoms is not None else extract_symptoms_from_text(text)
     if not user_symptoms:
         return {"symptoms": [], "matches": []}
 
-    user_set = set(user_symptoms)
-    conditions = _get_conditions(g)
-
-    scored: List[Dict[str, object]] = []
-
-    for cond_id, label in conditions:
-        cond_symptoms = get_symptoms(g, cond_id)
-        cond_set = set(s.lower() for s in cond_symptoms)
-
-        if not cond_set:
-            continue
-
-        overlap = user_set.intersection(cond_set)
-        if not overlap:
-            continue
-
-        # Simple score: proportion of condition's symptoms matched, scaled to %
-        score = (len(overlap) / len(cond_set)) * 100.0
-        scored.append({
-            "label": label,
-            "score": round(score, 1),
-        })
-
-    scored.sort(key=lambda x: x["score"], reverse=True)
+    scored = get_symptom_index(g).score(user_symptoms)
     return {
         "symptoms": user_symptoms,
         "matches": scored[:max_results],
@@ -1,11 +1,19 @@
 from pathlib import Path
+import threading
+from typing import Optional, Tuple
 from rdflib import Graph, Namespace, Literal, RDF
+from rdflib.plugins.sparql import prepareQuery
 from datetime import datetime
 import requests
 from bs4 import BeautifulSoup
 import re
 from collections import Counter
 
+import kg_journal
+from http_cache import HTTP_CACHE
+from singleflight import SingleFlight
+from kg_writer import kg_lock, read_version
+
 # --------------------
 #   KG FILE SETUP
 # --------------------
@@ -15,32 +23,83 @@ KG_FILE = KG_DIR / "mental_kg.ttl"
 
 MH = Namespace("http://example.org/mentalhealth#")
 
+# bumped on every KG write in this process; caches and indexes compare against it
+_KG_VERSION = 0
+
+# process-wide parsed KG: ((file stamp, version), graph); replaced on reload,
+# patched in place by _commit (additions before removals) on local writes
+_CACHED: Optional[Tuple[tuple, Graph]] = None
+_CACHE_LOCK = threading.Lock()
+
 
 # --------------------
 #   CORE GRAPH UTILS
 # --------------------
 def _init_graph() -> Graph:
-    """Load KG if exists, otherwise empty."""
-    g = Graph()
-    if KG_FILE.exists():
-        g.parse(str(KG_FILE), format="turtle")
-    return g
+    """Load KG if exists (snapshot + journal), otherwise empty."""
+    return kg_journal.load_with_journal(KG_FILE)
 
 
-def _save_graph(g: Graph) -> None:
-    g.serialize(destination=str(KG_FILE), format="turtle")
+def _commit(g: Graph, added: list, removed: list = ()) -> None:
+    """
+    Journal just the changed triples, then apply them in place to g, the
+    cached KG from load_graph() (no copy). Call under kg_lock(KG_FILE), with
+    a delta computed against that same graph that holds only real changes
+    (added not in g, removed in g, the two disjoint). Additions go in before
+    removals, so a concurrent reader sees a condition's old or new symptoms,
+    or briefly both, but never a partial list.
+    """
+    global _CACHED
+    with _CACHE_LOCK:  # load_graph() waits instead of reparsing mid-write
+        kg_journal.append(KG_FILE, added=added, removed=removed)
+        for t in added:
+            g.add(t)
+        for t in removed:
+            g.remove(t)
+        _bump_version()
+        _CACHED = (_stamp(), g)
 
 
-def get_symptoms(g: Graph, cond_id: str) -> list[str]:
-    """Fetch symptoms for a condition ID."""
-    q = f"""
+def _bump_version() -> None:
+    global _KG_VERSION
+    _KG_VERSION += 1
+
+
+def kg_version() -> int:
+    return _KG_VERSION
+
+
+def _stamp() -> tuple:
+    """
+    What the cached graph was built from: the shared version file (bumped by
+    every writer process), TTL + journal mtime/size and the local version.
+    """
+    files = [read_version(KG_FILE)]
+    for p in (KG_FILE, kg_journal.journal_path(KG_FILE), kg_journal.rotated_path(KG_FILE)):
+        try:
+            st = p.stat()
+            files.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            files.append(None)
+    return (tuple(files), _KG_VERSION)
+
+
+# Queries are parsed once here: rdflib's SPARQL parser is not thread-safe
+# (concurrent g.query(str) calls fail inside pyparsing), and parsing on each
+# call costs more than the lookup itself.
+SYMPTOMS_QUERY = prepareQuery("""
     PREFIX mh: <http://example.org/mentalhealth#>
-    SELECT ?label WHERE {{
-        mh:{cond_id} mh:associated_with ?symptom .
+    SELECT ?label WHERE {
+        ?cond mh:associated_with ?symptom .
         ?symptom mh:label ?label .
-    }}
-    """
-    return [str(row[0]) for row in g.query(q)]
+    }
+    """)
+
+
+def get_symptoms(g: Graph, cond_id: str) -> list[str]:
+    """Fetch symptoms for a condition ID."""
+    rows = g.query(SYMPTOMS_QUERY, initBindings={"cond": MH[cond_id]})
+    return [str(row[0]) for row in rows]
 
 
 # --------------------
@@ -58,100 +117,129 @@ def clean_text(html_text: str) -> str:
 
 UA = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
 
+# source -> search/page URL ({q} = condition, spaces replaced by "space") and
+# the base to prepend to the first result link ("" = absolute link,
+# None = the URL is already the article). Override for mirrors / tests.
+SOURCES = {
+    "wikipedia": {"url": "https://en.wikipedia.org/wiki/{q}", "space": "_", "follow": None},
+    "medlineplus": {"url": "https://medlineplus.gov/search/?q={q}", "space": "+", "follow": "https://medlineplus.gov"},
+    "mayo": {"url": "https://www.mayoclinic.org/search/search-results?q={q}", "space": "%20", "follow": "https://www.mayoclinic.org"},
+    "webmd": {"url": "https://www.webmd.com/search/search_results/default.aspx?query={q}", "space": "%20", "follow": ""},
+}
 
-def fetch_wikipedia(condition: str) -> str:
-    name = condition.replace(" ", "_")
-    url = f"https://en.wikipedia.org/wiki/{name}"
+
+def source_url(source: str, condition: str) -> str:
+    spec = SOURCES[source]
+    return spec["url"].format(q=condition.replace(" ", spec["space"]))
+
+
+def first_link(html: str, source: str):
+    """Article URL from a search results page (None if there is no link)."""
+    soup = BeautifulSoup(html, "lxml")
+    link = soup.find("a", href=True)
+    if not link:
+        return None
+    return SOURCES[source]["follow"] + link["href"]
+
+
+def page_text(html: str) -> str:
+    soup = BeautifulSoup(html, "lxml")
+    paragraphs = soup.find_all("p")
+    return clean_text(" ".join(p.get_text() for p in paragraphs))
+
+
+# http_cache derived-result name: content hash the KG was last written from
+KG_MARK = "kg_sha256"
+
+
+class SourceTexts(dict):
+    """source -> text, plus the cached page (url, sha256) each text came from."""
+
+    def __init__(self, texts=(), pages=None):
+        super().__init__(texts)
+        self.pages: dict[str, tuple] = dict(pages or {})
+
+    @property
+    def unchanged(self) -> bool:
+        """Every page we got is the exact version the last KG write used."""
+        got = [src for src, text in self.items() if text]
+        return bool(got) and all(
+            src in self.pages and HTTP_CACHE.is_used(*self.pages[src], KG_MARK) for src in got
+        )
+
+    def mark_written(self) -> None:
+        """Call after a KG write from these texts: their pages are now reflected."""
+        for src, text in self.items():
+            if text and src in self.pages:
+                HTTP_CACHE.mark_used(*self.pages[src], KG_MARK)
+
+
+def _fetch_source_page(source: str, condition: str):
+    """(text, (url, sha256) or None) for one source; article pages go through the HTTP cache."""
     try:
-        r = requests.get(url, headers=UA, timeout=8)
-        if r.status_code == 200:
-            soup = BeautifulSoup(r.text, "lxml")
-            paragraphs = soup.find_all("p")
-            return clean_text(" ".join(p.get_text() for p in paragraphs))
+        if SOURCES[source]["follow"] is None:
+            page_url = source_url(source, condition)
+        else:
+            r = requests.get(source_url(source, condition), headers=UA, timeout=8)
+            if r.status_code != 200:
+                return "", None
+            page_url = first_link(r.text, source)
+            if not page_url:
+                return "", None
+        page = HTTP_CACHE.get(page_url, headers=UA, timeout=8)
+        if page is None:
+            return "", None
+        return page_text(page.text), (page_url, page.sha256)
     except:
-        pass
-    return ""
+        return "", None
+
+
+def _fetch_source(source: str, condition: str) -> str:
+    return _fetch_source_page(source, condition)[0]
+
+
+def fetch_wikipedia(condition: str) -> str:
+    return _fetch_source("wikipedia", condition)
 
 
 def fetch_medlineplus(condition: str) -> str:
     """Search MedlinePlus. Simple scraping."""
-    try:
-        query = condition.replace(" ", "+")
-        url = f"https://medlineplus.gov/search/?q={query}"
-        r = requests.get(url, headers=UA, timeout=8)
-        if r.status_code != 200:
-            return ""
-
-        soup = BeautifulSoup(r.text, "lxml")
-        result = soup.find("a", href=True)
-        if not result:
-            return ""
-
-        page_url = "https://medlineplus.gov" + result["href"]
-        r2 = requests.get(page_url, headers=UA, timeout=8)
-        soup2 = BeautifulSoup(r2.text, "lxml")
-        paragraphs = soup2.find_all("p")
-        return clean_text(" ".join(p.get_text() for p in paragraphs))
-    except:
-        return ""
+    return _fetch_source("medlineplus", condition)
 
 
 def fetch_mayo(condition: str) -> str:
-    try:
-        query = condition.replace(" ", "%20")
-        url = f"https://www.mayoclinic.org/search/search-results?q={query}"
-        r = requests.get(url, headers=UA, timeout=8)
-        if r.status_code != 200:
-            return ""
-
-        soup = BeautifulSoup(r.text, "lxml")
-        link = soup.find("a", href=True)
-        if not link:
-            return ""
-
-        page = "https://www.mayoclinic.org" + link["href"]
-        r2 = requests.get(page, headers=UA, timeout=8)
-        soup2 = BeautifulSoup(r2.text, "lxml")
-        paragraphs = soup2.find_all("p")
-        return clean_text(" ".join(p.get_text() for p in paragraphs))
-    except:
-        return ""
+    return _fetch_source("mayo", condition)
 
 
 def fetch_webmd(condition: str) -> str:
-    try:
-        query = condition.replace(" ", "%20")
-        search_url = f"https://www.webmd.com/search/search_results/default.aspx?query={query}"
-        r = requests.get(search_url, headers=UA, timeout=8)
-        if r.status_code != 200:
-            return ""
-
-        soup = BeautifulSoup(r.text, "lxml")
-        link = soup.find("a", href=True)
-        if not link:
-            return ""
-
-        page_url = link["href"]
-        r2 = requests.get(page_url, headers=UA, timeout=8)
-        soup2 = BeautifulSoup(r2.text, "lxml")
-        paragraphs = soup2.find_all("p")
-        return clean_text(" ".join(p.get_text() for p in paragraphs))
-    except:
-        return ""
+    return _fetch_source("webmd", condition)
 
 
 # --------------------
 #   MULTI-SOURCE AGGREGATOR
 # --------------------
 
-def fetch_text_from_sources(condition_name: str) -> dict[str, str]:
-    """Scrape four sources; return dict of texts."""
-    return {
-        "wikipedia": fetch_wikipedia(condition_name),
-        "medlineplus": fetch_medlineplus(condition_name),
-        "mayo": fetch_mayo(condition_name),
-        "webmd": fetch_webmd(condition_name),
-    }
+# all sources at once over a pooled aiohttp session (async_fetch.py);
+# False = the original one-after-another requests calls
+ASYNC_FETCH = True
+FETCH_DEADLINE_S = 10.0
+
+
+def fetch_text_from_sources(condition_name: str, deadline: float = None) -> SourceTexts:
+    """
+    Scrape four sources; return dict of texts. Sources that did not finish
+    within the deadline come back as "". `.pages` says which cached page
+    version each text came from.
+    """
+    if ASYNC_FETCH:
+        from async_fetch import fetch_all
+
+        return fetch_all(condition_name, FETCH_DEADLINE_S if deadline is None else deadline)
+    pages = {source: _fetch_source_page(source, condition_name) for source in SOURCES}
+    return SourceTexts(
+        {source: text for source, (text, _) in pages.items()},
+        {source: page for source, (_, page) in pages.items() if page},
+    )
 
 
 # --------------------
@@ -230,27 +318,123 @@ def _add_condition(g: Graph, cond_id: str, label: str, symptoms: list[str]) -> N
         g.add((cu, MH.associated_with, su))
 
 
-def ensure_condition_from_sources(condition: str) -> None:
+# concurrent ensures of one condition (any thread / caller) share one scrape
+_ENSURE_FLIGHTS = SingleFlight()
+
+
+def ensure_condition_from_sources(condition: str, refresh: bool = False) -> bool:
     """
     Ensure disorder exists in KG.
-    - If present → do nothing.
+    - If present → do nothing (refresh=True: re-scrape and replace its
+      symptoms and last_updated instead).
     - If new → scrape 4 sources, extract symptoms, save.
+    Scraping runs without the KG lock; the write re-checks under it, since
+    another worker may have added the condition meanwhile.
+    Returns True when the KG was written. Calls for a condition that is
+    already being scraped wait for that scrape and return its result.
     """
-    g = _init_graph()
-
     cond_id = re.sub(r"[^A-Za-z0-9]", "", condition.title())
-    if get_symptoms(g, cond_id):
-        return  # already exists
+    if not refresh and get_symptoms(load_graph(), cond_id):
+        return False  # already exists (fast path, no flight needed)
+    return _ENSURE_FLIGHTS.do(cond_id, lambda: _ensure_condition(condition, cond_id, refresh))
+
+
+def _ensure_condition(condition: str, cond_id: str, refresh: bool) -> bool:
+    if not refresh and get_symptoms(load_graph(), cond_id):
+        return False  # already exists
 
     texts = fetch_text_from_sources(condition)
+    if refresh and texts.unchanged:
+        # same pages the KG was built from -> same symptoms: skip extraction,
+        # only mark the condition checked
+        print(f"[HTTP CACHE] {condition}: sources unchanged, last_updated bumped")
+        write_conditions([], touch=[condition])
+        return False
+
     symptoms = extract_common_symptoms(texts)
 
     if not symptoms:
-        return  # do NOT fabricate
+        return False  # do NOT fabricate (a failed refresh keeps the old data)
+
+    written = write_conditions([(condition, symptoms)], refresh=refresh) > 0
+    if written:
+        texts.mark_written()
+    return written
 
-    _add_condition(g, cond_id, condition, symptoms)
-    _save_graph(g)
+
+def write_conditions(batch, refresh: bool = False, touch=()) -> int:
+    """
+    Add many (label, symptoms) conditions in one locked KG commit; conditions
+    already in the KG are skipped, or with refresh=True get their symptoms
+    and last_updated replaced. Conditions in `touch` (revalidated, sources
+    unchanged) only get a new last_updated, so they stop looking stale.
+    Returns the number of conditions whose symptoms were written.
+    """
+    written = touched = 0
+    with kg_lock(KG_FILE):
+        g = load_graph()  # latest state, including other processes' writes
+        added, removed = [], []
+        seen = set()
+        for label, symptoms in batch:
+            if not symptoms:
+                continue
+            cond_id = re.sub(r"[^A-Za-z0-9]", "", label.title())
+            if cond_id in seen:
+                continue
+            exists = bool(get_symptoms(g, cond_id))
+            if exists and not refresh:
+                continue
+            seen.add(cond_id)
+
+            delta = Graph()
+            _add_condition(delta, cond_id, label, symptoms)
+            new = set(delta)
+            if exists:
+                cu = MH[cond_id]
+                old = set(g.triples((cu, MH.associated_with, None)))
+                old |= set(g.triples((cu, MH.last_updated, None)))
+                removed += old - new  # symptoms that stay are not journaled
+            added += [t for t in new if t not in g]
+            written += 1
+
+        now = Literal(datetime.utcnow().isoformat())
+        for label in touch:
+            cond_id = re.sub(r"[^A-Za-z0-9]", "", label.title())
+            cu = MH[cond_id]
+            old = list(g.triples((cu, MH.last_updated, None)))
+            if cond_id in seen or not old:
+                continue  # rewritten above / not in the KG
+            seen.add(cond_id)
+            removed += [t for t in old if t[2] != now]
+            added.append((cu, MH.last_updated, now))
+            touched += 1
+
+        added = list(dict.fromkeys(added))  # symptom nodes shared by several conditions
+        if written or touched:
+            _commit(g, added, removed)
+    if written or touched:
+        kg_journal.compact_in_background(KG_FILE)
+    return written
 
 
 def load_graph() -> Graph:
-    return _init_graph()
+    """
+    Process-wide cached KG, reloaded only when the TTL/journal mtime/size or
+    the write version changed. The returned graph is shared: treat it as
+    read-only (writers hold kg_lock and change it only through _commit).
+    """
+    global _CACHED
+    stamp = _stamp()
+    cached = _CACHED
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with _CACHE_LOCK:
+        cached = _CACHED
+        stamp = _stamp()
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        # parse off to the side, then swap the reference in one step
+        g = _init_graph()
+        _CACHED = (stamp, g)
+    return g
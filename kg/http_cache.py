@@ -0,0 +1,144 @@
+# kg/http_cache.py
+"""
+Persistent conditional-GET cache for scraped source pages.
+
+One entry per URL under knowledge_graph/http_cache/:
+    <sha256(url)>.json    url, ETag, Last-Modified, content hash, fetched_at,
+                          plus results derived from this exact content
+    <sha256(url)>.z       the page text, zlib-compressed
+
+Revalidation sends If-None-Match / If-Modified-Since. A 304, or a 200 whose
+content hash equals the stored one, comes back as changed=False (same as the
+last fetch). Whether the KG already reflects a page is a separate question:
+writers mark the hash they used (mark_used) and compare with is_used, since
+a fetched page may never have made it into a write (deadline, crash).
+"""
+import hashlib
+import json
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional
+
+import requests
+
+try:
+    from kg_writer import atomic_write
+except ImportError:  # imported as kg.http_cache
+    from kg.kg_writer import atomic_write
+
+CACHE_DIR = Path("knowledge_graph") / "http_cache"
+COMPRESS_LEVEL = 6
+
+
+class CachedPage(NamedTuple):
+    text: str
+    changed: bool       # False: same content as the last fetch
+    status: int         # 200 / 304 from the server
+    sha256: str = ""    # content hash (cache key for derived results)
+
+
+class HTTPCache:
+    def __init__(self, directory: Path = CACHE_DIR):
+        self.directory = Path(directory)
+        self.stats = {"fetched": 0, "not_modified": 0, "same_hash": 0, "changed": 0}
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{key}.json", self.directory / f"{key}.z"
+
+    def entry(self, url: str) -> Optional[Dict[str, Any]]:
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        return meta if body_path.exists() else None
+
+    def body(self, url: str) -> Optional[str]:
+        _, body_path = self._paths(url)
+        try:
+            return zlib.decompress(body_path.read_bytes()).decode("utf-8")
+        except (FileNotFoundError, zlib.error):
+            return None
+
+    def revalidation_headers(self, url: str) -> Dict[str, str]:
+        meta = self.entry(url)
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def _write_meta(self, url: str, meta: Dict[str, Any]) -> None:
+        meta_path, _ = self._paths(url)
+        data = json.dumps(meta, ensure_ascii=False)
+        atomic_write(meta_path, lambda tmp: Path(tmp).write_text(data, encoding="utf-8"))
+
+    def update(self, url: str, status: int, text: Optional[str], headers) -> Optional[CachedPage]:
+        """Record a response. Returns None for anything but 200/304 (or a 304 we cannot serve)."""
+        self.stats["fetched"] += 1
+        meta = self.entry(url)
+
+        if status == 304:
+            cached = self.body(url) if meta else None
+            if cached is None:
+                return None
+            self.stats["not_modified"] += 1
+            meta["fetched_at"] = time.time()
+            self._write_meta(url, meta)
+            return CachedPage(cached, False, 304, meta["sha256"])
+
+        if status != 200 or text is None:
+            return None
+
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        changed = meta is None or meta.get("sha256") != digest
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if changed:
+            self.stats["changed"] += 1
+            _, body_path = self._paths(url)
+            blob = zlib.compress(text.encode("utf-8"), COMPRESS_LEVEL)
+            atomic_write(body_path, lambda tmp: Path(tmp).write_bytes(blob))
+        else:
+            self.stats["same_hash"] += 1
+
+        self._write_meta(url, {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "sha256": digest,
+            "fetched_at": time.time(),
+            "derived": {} if changed else meta.get("derived", {}),
+        })
+        return CachedPage(text, changed, 200, digest)
+
+    def get(self, url: str, headers: Dict[str, str] = None, timeout: float = 8) -> Optional[CachedPage]:
+        """Blocking conditional GET through requests."""
+        r = requests.get(url, headers={**(headers or {}), **self.revalidation_headers(url)}, timeout=timeout)
+        return self.update(url, r.status_code, r.text if r.status_code == 200 else None, r.headers)
+
+    # results computed from a page, valid while its content hash is unchanged
+    def derived(self, url: str, name: str) -> Any:
+        meta = self.entry(url)
+        return meta.get("derived", {}).get(name) if meta else None
+
+    def set_derived(self, url: str, name: str, value: Any) -> None:
+        meta = self.entry(url)
+        if meta is None:
+            return
+        meta.setdefault("derived", {})[name] = value
+        self._write_meta(url, meta)
+
+    # which content version a consumer (e.g. the KG) was last built from
+    def is_used(self, url: str, sha256: str, name: str) -> bool:
+        return bool(sha256) and self.derived(url, name) == sha256
+
+    def mark_used(self, url: str, sha256: str, name: str) -> None:
+        """Record that `name` now reflects this version (a later change resets derived)."""
+        self.set_derived(url, name, sha256)
+
+
+HTTP_CACHE = HTTPCache()
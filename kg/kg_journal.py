@@ -0,0 +1,178 @@
+# kg/kg_journal.py
+"""
+Append-only delta journal for a Turtle KG, so an update costs what it changes.
+
+    mental_kg.ttl (+ .kgsnap)   last full snapshot
+    mental_kg.journal           one N-Triples line per change since then:
+                                    A <s> <p> <o> .      added
+                                    D <s> <p> <o> .      removed
+
+Loading = snapshot + journal replayed in order. Compaction rotates the
+journal aside (mental_kg.journal.compacting), folds it into a new full
+snapshot, then deletes it. Writers keep appending to a fresh journal
+meanwhile, and a crash at any step only leaves entries that replay
+idempotently.
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from rdflib import Graph
+
+from kg_snapshot import load_graph_file, save_graph_file, snapshot_path
+from kg_writer import bump_version, kg_lock
+
+ADD, DELETE = "A", "D"
+JOURNAL_SUFFIX = ".journal"
+COMPACT_BYTES = 1 << 20  # compact once the journal outgrows this
+
+Triple = Tuple[object, object, object]
+
+_COMPACTING: Dict[Path, threading.Thread] = {}
+_COMPACT_LOCK = threading.Lock()
+
+
+def journal_path(ttl_path: Union[str, Path]) -> Path:
+    return Path(ttl_path).with_suffix(JOURNAL_SUFFIX)
+
+
+def rotated_path(ttl_path: Union[str, Path]) -> Path:
+    return journal_path(ttl_path).with_name(journal_path(ttl_path).name + ".compacting")
+
+
+def _nt_lines(triples: Iterable[Triple]) -> list[str]:
+    g = Graph()
+    for t in triples:
+        g.add(t)
+    if not len(g):
+        return []
+    return [line for line in g.serialize(format="nt").splitlines() if line.strip()]
+
+
+def append(ttl_path: Union[str, Path], added: Iterable[Triple] = (), removed: Iterable[Triple] = ()) -> int:
+    """Append one change set (removals first), fsync, bump the version; returns bytes written."""
+    lines = [f"{DELETE} {l}" for l in _nt_lines(removed)] + [f"{ADD} {l}" for l in _nt_lines(added)]
+    if not lines:
+        return 0
+    data = ("\n".join(lines) + "\n").encode("utf-8")
+    with kg_lock(ttl_path):
+        with open(journal_path(ttl_path), "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        bump_version(ttl_path)
+    return len(data)
+
+
+def _replay_file(path: Path, g: Graph, bnodes: dict) -> int:
+    """Apply a journal file to g, one run of same-op lines per parse."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return 0
+
+    ops = 0
+    run_op, run = None, []
+
+    def flush():
+        if not run:
+            return
+        delta = Graph()
+        delta.parse(data="\n".join(run), format="nt", bnode_context=bnodes)
+        for t in delta:
+            (g.add if run_op == ADD else g.remove)(t)
+
+    for line in lines:
+        op, _, triple = line.partition(" ")
+        if op not in (ADD, DELETE) or not triple.endswith("."):
+            continue  # torn last line after a crash
+        if op != run_op:
+            flush()
+            run_op, run = op, []
+        run.append(triple)
+        ops += 1
+    flush()
+    return ops
+
+
+def replay(ttl_path: Union[str, Path], g: Graph) -> int:
+    """Apply the rotated journal (if a compaction is pending) then the live one."""
+    bnodes: dict = {}
+    return _replay_file(rotated_path(ttl_path), g, bnodes) + _replay_file(journal_path(ttl_path), g, bnodes)
+
+
+def load_with_journal(ttl_path: Union[str, Path], g: Graph = None) -> Graph:
+    """Last full snapshot (binary or Turtle) plus every journaled change."""
+    g = g if g is not None else Graph()
+    if Path(ttl_path).exists() or snapshot_path(ttl_path).exists():
+        load_graph_file(ttl_path, g)
+    replay(ttl_path, g)
+    return g
+
+
+def journal_bytes(ttl_path: Union[str, Path]) -> int:
+    total = 0
+    for p in (journal_path(ttl_path), rotated_path(ttl_path)):
+        try:
+            total += p.stat().st_size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def compact(ttl_path: Union[str, Path]) -> bool:
+    """
+    Fold the journal into a new full TTL + snapshot. Returns False if there
+    is nothing to do or another process is already compacting.
+    """
+    live, rotated = journal_path(ttl_path), rotated_path(ttl_path)
+    with kg_lock(ttl_path, "compact", blocking=False) as acquired:
+        if not acquired:
+            return False
+        with kg_lock(ttl_path):
+            if not rotated.exists():
+                if not live.exists():
+                    return False
+                os.replace(live, rotated)  # new appends go to a fresh journal from here on
+
+        # the slow part runs without the write lock; appenders only touch the live journal
+        g = Graph()
+        if Path(ttl_path).exists() or snapshot_path(ttl_path).exists():
+            load_graph_file(ttl_path, g)
+        ops = _replay_file(rotated, g, {})
+
+        with kg_lock(ttl_path):
+            save_graph_file(g, ttl_path)
+            rotated.unlink()
+            bump_version(ttl_path)
+    print(f"[KG JOURNAL] compacted {ops} changes into {ttl_path}")
+    return True
+
+
+def rewrite(ttl_path: Union[str, Path], g: Graph) -> None:
+    """
+    Replace the KG with g in full (g must already hold every journaled
+    change) and drop the journal.
+    """
+    with kg_lock(ttl_path, "compact"), kg_lock(ttl_path):
+        save_graph_file(g, ttl_path)
+        for p in (journal_path(ttl_path), rotated_path(ttl_path)):
+            p.unlink(missing_ok=True)
+        bump_version(ttl_path)
+
+
+def compact_in_background(ttl_path: Union[str, Path], threshold: int = COMPACT_BYTES) -> Optional[threading.Thread]:
+    """Start a compaction thread if the journal is over threshold and none is running."""
+    key = Path(ttl_path).resolve()
+    with _COMPACT_LOCK:
+        running = _COMPACTING.get(key)
+        if running is not None and running.is_alive():
+            return None
+        if journal_bytes(ttl_path) < threshold:
+            return None
+        t = threading.Thread(target=compact, args=(ttl_path,), name="kg-compact", daemon=True)
+        _COMPACTING[key] = t
+        t.start()
+    return t
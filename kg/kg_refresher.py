@@ -0,0 +1,159 @@
+# kg/kg_refresher.py
+"""
+Background KG refresh (stale-while-revalidate).
+
+Stale conditions are answered from the KG right away while a refresh job
+runs here. Only a condition the KG has never seen makes the caller wait,
+and only for MISSING_WAIT_S. Jobs are deduplicated by condition id, so a
+trending condition is scraped once however many requests ask for it.
+Jobs someone waits for (ensure) jump ahead of queued background refreshes.
+A scrape that wrote nothing (sources down, blocked, no symptoms found) is
+not retried for RETRY_AFTER, however often the condition is asked for.
+
+A refresh whose source pages turn out unchanged (http_cache) only bumps the
+condition's mh:last_updated, so it stops looking stale in every process.
+"""
+import itertools
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from dynamic_kg import FETCH_DEADLINE_S, ensure_condition_from_sources
+
+REFRESH_WORKERS = 2
+STALE_AFTER = timedelta(days=30)
+RETRY_AFTER = timedelta(minutes=15)  # backoff after a scrape that wrote nothing
+# budget a user waits for a condition we do not have: the whole fetch deadline
+# plus symptom extraction and the KG write, so a slow source does not turn a
+# scrape that will succeed into a fallback answer
+WRITE_OVERHEAD_S = 2.0
+MISSING_WAIT_S = FETCH_DEADLINE_S + WRITE_OVERHEAD_S
+
+# queue priorities (lower runs first)
+WAITED = 0        # a user is blocked in ensure()
+BACKGROUND = 1    # stale refreshes nobody waits for
+_STOP = 2
+
+
+def is_stale(timestamp: Optional[str], now: datetime = None) -> bool:
+    """True if an mh:last_updated value is older than STALE_AFTER (unparseable = not stale)."""
+    if not timestamp:
+        return False
+    try:
+        ts = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return False
+    return (now or datetime.utcnow()) - ts > STALE_AFTER
+
+
+class KGRefresher:
+    def __init__(self, workers: int = REFRESH_WORKERS):
+        self.workers = workers
+        # (priority, seq, cond_id); seq keeps FIFO order within a priority
+        self._queue: "queue.PriorityQueue[tuple]" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._jobs: Dict[str, Future] = {}  # cond_id -> queued or running job
+        self._failed: Dict[str, float] = {}  # cond_id -> monotonic time of last failed scrape
+        self._lock = threading.Lock()
+        self._threads = []
+        self.stats = {"queued": 0, "deduplicated": 0, "backoff": 0, "written": 0, "failed": 0}
+
+    def _start(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"kg-refresh-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, condition: str, refresh: bool = False, priority: int = BACKGROUND) -> Future:
+        """
+        Queue ensure_condition_from_sources(condition, refresh). If a job for the
+        same condition is already queued or running, return its future instead
+        (re-queued at the higher priority if it has not started yet).
+        The future resolves to True when the KG was written.
+        """
+        cond_id = re.sub(r"[^A-Za-z0-9]", "", condition.title())
+        with self._lock:
+            self._start()
+            job = self._jobs.get(cond_id)
+            if job is not None:
+                self.stats["deduplicated"] += 1
+                if priority < job.priority and not job.running():
+                    job.priority = priority  # the older queue entry is skipped
+                    self._queue.put((priority, next(self._seq), cond_id))
+                return job
+            failed_at = self._failed.get(cond_id)
+            if failed_at is not None and time.monotonic() - failed_at < RETRY_AFTER.total_seconds():
+                self.stats["backoff"] += 1
+                job = Future()
+                job.set_result(False)
+                return job
+            job = Future()
+            job.condition, job.refresh, job.priority = condition, refresh, priority
+            self._jobs[cond_id] = job
+            self.stats["queued"] += 1
+            self._queue.put((priority, next(self._seq), cond_id))
+        return job
+
+    def ensure(self, condition: str, wait: float = MISSING_WAIT_S) -> bool:
+        """Queue a job for a missing condition and wait up to `wait` seconds for it."""
+        job = self.submit(condition, priority=WAITED)
+        try:
+            return bool(job.result(timeout=wait))
+        except FutureTimeout:
+            return False  # keeps running; a later request will find it in the KG
+        except Exception:
+            return False
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+    def _work(self) -> None:
+        while True:
+            priority, _, cond_id = self._queue.get()
+            if cond_id is None:
+                return
+            with self._lock:
+                job = self._jobs.get(cond_id)
+                if job is None or job.running() or priority != job.priority:
+                    continue  # superseded entry of a re-prioritized job
+                if not job.set_running_or_notify_cancel():
+                    self._jobs.pop(cond_id, None)
+                    continue
+            try:
+                written = ensure_condition_from_sources(job.condition, refresh=job.refresh)
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"[KG REFRESH] {job.condition} failed: {e}")
+                with self._lock:
+                    self._jobs.pop(cond_id, None)
+                    self._failed[cond_id] = time.monotonic()
+                job.set_exception(e)
+                continue
+            if written:
+                self.stats["written"] += 1
+                print(f"[KG UPDATED] {'refreshed' if job.refresh else 'added'} {job.condition}")
+            with self._lock:
+                self._jobs.pop(cond_id, None)
+                if written:
+                    self._failed.pop(cond_id, None)
+                else:
+                    self._failed[cond_id] = time.monotonic()
+            job.set_result(written)
+
+    def stop(self) -> None:
+        for _ in self._threads:
+            self._queue.put((_STOP, next(self._seq), None))
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+
+REFRESHER = KGRefresher()
@@ -0,0 +1,194 @@
+# kg/kg_snapshot.py
+"""
+Binary KG snapshot written next to a Turtle file, so loaders skip text parsing.
+
+    mental_kg.ttl  ->  mental_kg.kgsnap
+
+Layout (little endian; every section starts on an 8-byte boundary):
+    header      magic, format, n_ns, n_strings, n_terms, n_triples, blob_len
+    strings     uint64[n_strings + 1] offsets, then the UTF-8 blob
+    namespaces  uint32[n_ns, 2]        (prefix id, uri id)
+    terms       uint32[n_terms, 4]     (kind, value id, datatype id, lang id)
+    triples     uint32[n_triples, 3]   (s, p, o term ids)
+
+Every term and string is stored once, and triples are packed integer
+arrays. The file is mmapped and read with numpy.frombuffer.
+"""
+import gc
+import mmap
+import struct
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+from rdflib import BNode, Graph, Literal, URIRef
+
+from kg_writer import atomic_write
+
+MAGIC = b"KGSNAP\x00\x01"
+FORMAT = 1
+HEADER = struct.Struct("<8sIIIIIQ")
+SUFFIX = ".kgsnap"
+NONE = 0xFFFFFFFF
+
+URI, BLANK, LITERAL = 0, 1, 2
+
+
+def snapshot_path(ttl_path: Union[str, Path]) -> Path:
+    return Path(ttl_path).with_suffix(SUFFIX)
+
+
+def _pad(n: int) -> int:
+    return (n + 7) & ~7
+
+
+@contextmanager
+def _gc_paused():
+    """Millions of new term/tuple objects would otherwise trigger repeated full GCs."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def write_snapshot(g: Graph, path: Union[str, Path]) -> Path:
+    """Serialize g to path (atomic_write, so readers never see a partial file)."""
+    path = Path(path)
+    strings: Dict[str, int] = {}
+    terms: Dict[object, int] = {}
+    term_rows: List[Tuple[int, int, int, int]] = []
+
+    def sid(s) -> int:
+        if s is None:
+            return NONE
+        s = str(s)
+        i = strings.get(s)
+        if i is None:
+            i = strings[s] = len(strings)
+        return i
+
+    def tid(t) -> int:
+        i = terms.get(t)
+        if i is not None:
+            return i
+        if isinstance(t, Literal):
+            row = (LITERAL, sid(t), sid(t.datatype), sid(t.language))
+        elif isinstance(t, BNode):
+            row = (BLANK, sid(t), NONE, NONE)
+        else:
+            row = (URI, sid(t), NONE, NONE)
+        i = terms[t] = len(term_rows)
+        term_rows.append(row)
+        return i
+
+    triples = np.array(
+        [(tid(s), tid(p), tid(o)) for s, p, o in g], dtype="<u4"
+    ).reshape(-1, 3)
+    ns = np.array(
+        [(sid(prefix), sid(uri)) for prefix, uri in g.namespaces()], dtype="<u4"
+    ).reshape(-1, 2)
+    term_arr = np.array(term_rows, dtype="<u4").reshape(-1, 4)
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = b"".join(encoded)
+
+    header = HEADER.pack(MAGIC, FORMAT, len(ns), len(encoded), len(term_arr), len(triples), len(blob))
+
+    def write(tmp: str) -> None:
+        with open(tmp, "wb") as f:
+            for chunk in (header, offsets.tobytes(), blob, ns.tobytes(), term_arr.tobytes(), triples.tobytes()):
+                f.write(chunk)
+                f.write(b"\0" * (_pad(len(chunk)) - len(chunk)))
+
+    atomic_write(path, write)
+    return path
+
+
+def read_snapshot(path: Union[str, Path]) -> Tuple[List[str], list, list, list]:
+    """Decode a snapshot into (strings, namespaces, term rows, triple rows)."""
+    with _gc_paused(), open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, fmt, n_ns, n_strings, n_terms, n_triples, blob_len = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or fmt != FORMAT:
+            raise ValueError(f"{path} is not a KG snapshot (format {FORMAT})")
+
+        pos = _pad(HEADER.size)
+        offsets = np.frombuffer(mm, dtype="<u8", count=n_strings + 1, offset=pos).tolist()
+        pos += _pad(8 * (n_strings + 1))
+        blob_start = pos
+        strings = [
+            mm[blob_start + offsets[i]:blob_start + offsets[i + 1]].decode("utf-8")
+            for i in range(n_strings)
+        ]
+        pos += _pad(blob_len)
+        ns = np.frombuffer(mm, dtype="<u4", count=2 * n_ns, offset=pos).reshape(-1, 2).tolist()
+        pos += _pad(8 * n_ns)
+        term_rows = np.frombuffer(mm, dtype="<u4", count=4 * n_terms, offset=pos).reshape(-1, 4).tolist()
+        pos += _pad(16 * n_terms)
+        triples = np.frombuffer(mm, dtype="<u4", count=3 * n_triples, offset=pos).reshape(-1, 3).tolist()
+    return strings, ns, term_rows, triples
+
+
+def load_snapshot(path: Union[str, Path], g: Graph = None) -> Graph:
+    """
+    Load a snapshot into g (or a new Graph). Decoding takes milliseconds;
+    most of the time goes to inserting the triples into rdflib's store.
+    """
+    g = g if g is not None else Graph()
+    strings, ns, term_rows, triples = read_snapshot(path)
+
+    for prefix, uri in ns:
+        g.bind(strings[prefix], strings[uri], override=True, replace=True)
+
+    with _gc_paused():
+        terms = []
+        for kind, value, datatype, lang in term_rows:
+            if kind == LITERAL:
+                terms.append(Literal(
+                    strings[value],
+                    lang=strings[lang] if lang != NONE else None,
+                    datatype=strings[datatype] if datatype != NONE else None,
+                    normalize=False,
+                ))
+            elif kind == BLANK:
+                terms.append(BNode(strings[value]))
+            else:
+                terms.append(URIRef(strings[value]))
+
+        g.addN((terms[s], terms[p], terms[o], g) for s, p, o in triples)
+    return g
+
+
+def snapshot_is_fresh(ttl_path: Union[str, Path]) -> bool:
+    snap = snapshot_path(ttl_path)
+    try:
+        return snap.stat().st_mtime_ns >= Path(ttl_path).stat().st_mtime_ns
+    except FileNotFoundError:
+        return snap.exists()
+
+
+def load_graph_file(ttl_path: Union[str, Path], g: Graph = None, format: str = "turtle") -> Graph:
+    """
+    Load ttl_path into g, preferring the binary snapshot when it is at least
+    as new as the Turtle file. Falls back to parsing on a bad snapshot.
+    """
+    g = g if g is not None else Graph()
+    if snapshot_is_fresh(ttl_path):
+        try:
+            return load_snapshot(snapshot_path(ttl_path), g)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"[KG SNAPSHOT] ignoring {snapshot_path(ttl_path)}: {e}")
+            g.remove((None, None, None))
+    g.parse(str(ttl_path), format=format)
+    return g
+
+
+def save_graph_file(g: Graph, ttl_path: Union[str, Path], format: str = "turtle") -> None:
+    """Serialize g to ttl_path (atomically), then refresh the snapshot next to it."""
+    atomic_write(ttl_path, lambda tmp: g.serialize(destination=tmp, format=format))
+    write_snapshot(g, snapshot_path(ttl_path))
@@ -0,0 +1,161 @@
+# kg/kg_writer.py
+"""
+Write coordination for a KG file shared by several worker processes.
+
+    with kg_lock(KG_FILE):          # exclusive across processes (and threads)
+        ... read latest, modify, journal / atomic_write ...
+        bump_version(KG_FILE)       # tells other processes to reload
+
+- kg_lock: fcntl.flock on <name>.lock (msvcrt.locking on Windows)
+- atomic_write: temp file in the same directory, fsync, os.replace, fsync dir
+- <name>.version holds a counter that readers include in their cache stamp
+"""
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_THREAD_LOCKS: Dict[Path, threading.RLock] = {}
+_THREAD_LOCKS_GUARD = threading.Lock()
+_HELD = threading.local()
+
+
+def lock_path(path: Union[str, Path], name: str = "") -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.stem}.{name}.lock" if name else f"{path.stem}.lock")
+
+
+def version_path(path: Union[str, Path]) -> Path:
+    path = Path(path)
+    return path.with_name(f"{path.stem}.version")
+
+
+def _thread_lock(key: Path) -> threading.RLock:
+    with _THREAD_LOCKS_GUARD:
+        lock = _THREAD_LOCKS.get(key)
+        if lock is None:
+            lock = _THREAD_LOCKS[key] = threading.RLock()
+        return lock
+
+
+def _lock_file(fd: int, blocking: bool) -> bool:
+    if fcntl is not None:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.05)
+
+
+def _unlock_file(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def kg_lock(path: Union[str, Path], name: str = "", blocking: bool = True) -> Iterator[bool]:
+    """
+    Exclusive lock for path (name picks an independent lock, e.g. "compact").
+    Re-entrant within a thread. With blocking=False, yields False instead of
+    waiting when another holder has it.
+    """
+    key = lock_path(path, name).resolve()
+    held = getattr(_HELD, "keys", None)
+    if held is None:
+        held = _HELD.keys = {}
+    if held.get(key):
+        held[key] += 1
+        try:
+            yield True
+        finally:
+            held[key] -= 1
+        return
+
+    tlock = _thread_lock(key)
+    if not tlock.acquire(blocking):
+        yield False
+        return
+    try:
+        key.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(key, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if not _lock_file(fd, blocking):
+                yield False
+                return
+            held[key] = 1
+            try:
+                yield True
+            finally:
+                held.pop(key, None)
+                _unlock_file(fd)
+        finally:
+            os.close(fd)
+    finally:
+        tlock.release()
+
+
+def _fsync_dir(directory: Path) -> None:
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: Union[str, Path], write: Callable[[str], None]) -> None:
+    """
+    write(tmp_path) fills a temp file next to path; it is then fsynced and
+    renamed over path, so readers see either the old or the new file.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent or ".")
+    os.close(fd)
+    try:
+        os.chmod(tmp, 0o644)  # mkstemp creates 0600
+        write(tmp)
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    _fsync_dir(path.parent)
+
+
+def read_version(path: Union[str, Path]) -> int:
+    try:
+        return int(version_path(path).read_text().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_version(path: Union[str, Path]) -> int:
+    """Increment the shared version counter (call while holding kg_lock)."""
+    version = read_version(path) + 1
+    atomic_write(version_path(path), lambda tmp: Path(tmp).write_text(str(version)))
+    return version
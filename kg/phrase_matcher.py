@@ -0,0 +1,94 @@
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+
+class PhraseMatch(NamedTuple):
+    start: int
+    end: int
+    phrase: str
+    payload: object
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over many phrases: one left-to-right pass over the
+    text reports every (possibly overlapping) occurrence with its span.
+    - phrases are matched as given; callers normalize text the same way
+    - whole_word=True only accepts matches not glued to letters/digits
+      ("hyper" does not match inside "hyperlink")
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # node -> [(length, phrase, payload, whole_word)] ending exactly here
+        self._own: List[List[Tuple[int, str, object, bool]]] = [[]]
+        # same, plus everything reachable through failure links (after build)
+        self._out: List[List[Tuple[int, str, object, bool]]] = [[]]
+        self._built = False
+        self.size = 0
+
+    def add(self, phrase: str, payload: object = None, whole_word: bool = False) -> None:
+        if not phrase:
+            return
+        node = 0
+        for ch in phrase:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+            node = nxt
+        self._own[node].append((len(phrase), phrase, payload, whole_word))
+        self._built = False
+        self.size += 1
+
+    def build(self) -> None:
+        """Compute failure links (BFS); called lazily by finditer."""
+        goto = self._goto
+        fail = [0] * len(goto)
+        out = [list(o) for o in self._own]
+
+        queue = list(goto[0].values())
+        i = 0
+        while i < len(queue):
+            node = queue[i]
+            i += 1
+            for ch, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fallback = goto[f].get(ch, 0)
+                fail[nxt] = fallback if fallback != nxt else 0
+                out[nxt] = out[nxt] + out[fail[nxt]]
+
+        # swap in complete tables so concurrent readers never see half a build
+        self._fail, self._out = fail, out
+        self._built = True
+
+    def finditer(self, text: str) -> Iterator[PhraseMatch]:
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        n = len(text)
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            end = i + 1
+            for length, phrase, payload, whole_word in out[node]:
+                start = end - length
+                if whole_word and (
+                    (start > 0 and text[start - 1].isalnum())
+                    or (end < n and text[end].isalnum())
+                ):
+                    continue
+                yield PhraseMatch(start, end, phrase, payload)
+
+    def findall(self, text: str) -> List[PhraseMatch]:
+        return list(self.finditer(text))
@@ -1,9 +1,10 @@
 from rdflib import Graph
 
+from kg_snapshot import load_graph_file
+
 def load_kg(path):
-    g = Graph()
-    g.parse(path, format="turtle")
-    return g
+    # binary snapshot next to the TTL when it is up to date, else parse
+    return load_graph_file(path, Graph())
 
 def get_symptoms_of_anxiety(g):
     query = """
@@ -1,5 +1,7 @@
 import re
-from typing import List, Dict
+from typing import Iterable, List, Dict
+
+from phrase_matcher import PhraseMatcher
 
 # Canonical symptom phrases to detect in user text.
 # These should match or be very close to what dynamic_kg stores.
@@ -64,18 +66,49 @@ def normalize_text(text: str) -> str:
     return text.strip()
 
 
+def build_symptom_matcher(sym_phrases: Dict[str, list[str]] = SYM_PHRASES) -> PhraseMatcher:
+    """
+    One automaton over every phrase; the payload is the canonical name.
+    Matches must sit on word boundaries ("hyper" does not hit "hyperlink").
+    """
+    matcher = PhraseMatcher()
+    for canonical, phrases in sym_phrases.items():
+        for phrase in phrases:
+            matcher.add(normalize_text(phrase), canonical, whole_word=True)
+    matcher.build()
+    return matcher
+
+
+_MATCHER = build_symptom_matcher()
+
+# bumped by reload_symptom_phrases; intent_router rebuilds its router on change
+_PHRASES_VERSION = 0
+
+
+def phrases_version() -> int:
+    return _PHRASES_VERSION
+
+
+def reload_symptom_phrases() -> None:
+    """Rebuild the matcher after SYM_PHRASES was changed at runtime."""
+    global _MATCHER, _PHRASES_VERSION
+    _MATCHER = build_symptom_matcher(SYM_PHRASES)
+    _PHRASES_VERSION += 1
+
+
 def extract_symptoms_from_text(text: str) -> List[str]:
     """
     Extracts symptom labels based on simple keyword and phrase rules.
     Returns canonical symptom names that can be matched against KG.
     """
     text = normalize_text(text)
-    found = set()
+    return sorted({m.payload for m in _MATCHER.finditer(text)})
 
-    for canonical, phrases in SYM_PHRASES.items():
-        for phrase in phrases:
-            if phrase in text:
-                found.add(canonical)
-                break
 
-    return sorted(found)
\ No newline at end of file
+def extract_symptoms_batch(texts: Iterable[str]) -> List[List[str]]:
+    """extract_symptoms_from_text over many texts, sharing one matcher."""
+    matcher = _MATCHER
+    return [
+        sorted({m.payload for m in matcher.finditer(normalize_text(t))})
+        for t in texts
+    ]
@@ -0,0 +1,102 @@
+# kg/test_async_fetch.py
+"""
+Checks the concurrent fetcher against a local stand-in for the four sources:
+    python kg/test_async_fetch.py
+- three sources answer, one hangs past the deadline -> partial result in time
+- later fetches reuse the keep-alive connections of the first one
+"""
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import dynamic_kg
+from async_fetch import get_fetcher
+from http_cache import HTTP_CACHE
+
+SLOW_S = 3.0
+DEADLINE_S = 1.0
+
+PAGES = {
+    "/wiki/Bipolar_disorder": "<p>Bipolar disorder causes mania and low mood.</p>",
+    "/medline/search": '<a href="/medline/page">result</a>',
+    "/medline/page": "<p>Symptoms include racing thoughts and insomnia.</p>",
+    "/mayo/search": '<a href="/mayo/page">result</a>',
+    "/mayo/page": "<p>Mood swings and fatigue are common.</p>",
+}
+
+connections = set()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/webmd/search":
+            time.sleep(SLOW_S)  # the client gives up on this one and drops the connection
+        else:
+            connections.add(self.client_address)
+        body = PAGES.get(path, '<a href="/webmd/page">x</a>' if path == "/webmd/search" else None)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass  # broken pipes from the cancelled slow source
+
+
+def main():
+    HTTP_CACHE.directory = Path(tempfile.mkdtemp()) / "http_cache"  # keep ./knowledge_graph clean
+    server = QuietServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    dynamic_kg.SOURCES = {
+        "wikipedia": {"url": base + "/wiki/{q}", "space": "_", "follow": None},
+        "medlineplus": {"url": base + "/medline/search?q={q}", "space": "+", "follow": base},
+        "mayo": {"url": base + "/mayo/search?q={q}", "space": "%20", "follow": base},
+        "webmd": {"url": base + "/webmd/search?query={q}", "space": "%20", "follow": base},
+    }
+
+    print(">>> Concurrent fetch with a hanging source")
+    t0 = time.perf_counter()
+    texts = dynamic_kg.fetch_text_from_sources("Bipolar disorder", deadline=DEADLINE_S)
+    elapsed = time.perf_counter() - t0
+    print(f"returned in {elapsed:.2f}s:", {k: len(v) for k, v in texts.items()})
+    assert elapsed < DEADLINE_S + 0.5, elapsed
+    assert "mania" in texts["wikipedia"]
+    assert "racing thoughts" in texts["medlineplus"]
+    assert "mood swings" in texts["mayo"]
+    assert texts["webmd"] == ""
+    print("symptoms:", dynamic_kg.extract_common_symptoms(texts))
+
+    print(">>> Connection reuse")
+    before = len(connections)
+    for _ in range(5):
+        dynamic_kg.fetch_text_from_sources("Bipolar disorder", deadline=DEADLINE_S)
+    new = len(connections) - before
+    print(f"5 more fetches (25 answered requests) opened {new} new connections")
+    assert new <= 1, new
+
+    print("fetcher stats:", get_fetcher().stats)
+    server.shutdown()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# kg/test_bulk_builder.py
+"""
+Checks the bulk builder against two local stand-in hosts:
+    python kg/test_bulk_builder.py
+- per-host concurrency and request rate stay within the limits
+- a run interrupted before its commit resumes from the checkpoint
+  without re-crawling the conditions already done
+- a host answering 500 is retried, then reported as failed
+- all results land in the KG in one commit
+- refreshing the unchanged catalog costs 304s and only bumps last_updated
+"""
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import bulk_builder
+import dynamic_kg
+from bulk_builder import BulkBuilder
+from http_cache import HTTP_CACHE
+
+PER_HOST = 2
+RATE = 40.0
+LATENCY_S = 0.05
+CONDITIONS = [f"Condition {i}" for i in range(12)] + ["Broken condition"]
+
+lock = threading.Lock()
+inflight = defaultdict(int)
+peak = defaultdict(int)
+starts = defaultdict(list)
+paths = []
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        host = self.server.name
+        with lock:
+            inflight[host] += 1
+            peak[host] = max(peak[host], inflight[host])
+            starts[host].append(time.monotonic())
+            paths.append(self.path)
+        try:
+            time.sleep(LATENCY_S)
+            self.reply()
+        finally:
+            with lock:
+                inflight[host] -= 1
+
+    def reply(self):
+        path, _, query = self.path.partition("?")
+        if "Broken" in self.path and self.server.name == "b":
+            return self.send(500, "")
+        if path.startswith("/wiki/"):
+            return self.send(200, f"<p>{path[6:]} brings insomnia and fatigue.</p>")
+        if path == "/search":
+            return self.send(200, f'<a href="/page/{query[2:]}">result</a>')
+        if path.startswith("/page/"):
+            return self.send(200, "<p>Look out for panic and worry.</p>")
+        self.send(404, "")
+
+    def send(self, status, body):
+        data = body.encode()
+        etag = f'"{hash(data)}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            status, data = 304, b""
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(name):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.name = name
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    tmp = Path(tempfile.mkdtemp())
+    dynamic_kg.KG_FILE = tmp / "mental_kg.ttl"
+    HTTP_CACHE.directory = tmp / "http_cache"
+    bulk_builder.BACKOFF_S = 0.05
+    checkpoint = tmp / "bulk.checkpoint.jsonl"
+
+    server_a, a = serve("a")
+    server_b, b = serve("b")
+    dynamic_kg.SOURCES = {
+        "wikipedia": {"url": a + "/wiki/{q}", "space": "_", "follow": None},
+        "medlineplus": {"url": b + "/search?q={q}", "space": "+", "follow": b},
+    }
+
+    commits = []
+    commit = dynamic_kg._commit
+    dynamic_kg._commit = lambda g, added, removed=(): (commits.append(len(added)), commit(g, added, removed))
+
+    print(">>> First run, interrupted after crawling (no commit)")
+    first = BulkBuilder(PER_HOST, RATE, in_flight=8, checkpoint=checkpoint)
+    first.crawl(CONDITIONS[:6])
+    first.report()
+    assert not commits and checkpoint.exists()
+
+    print(">>> Resumed run")
+    paths.clear()
+    builder = BulkBuilder(PER_HOST, RATE, in_flight=8, checkpoint=checkpoint)
+    builder.build(CONDITIONS)
+    builder.report()
+
+    assert builder.resumed == 6, builder.resumed
+    recrawled = [p for p in paths if re.search(r"Condition[_+]([0-5])\b", p)]
+    assert not recrawled, recrawled
+    assert builder.records["Broken condition"]["failed_sources"] == ["medlineplus"]
+    assert builder.hosts[b.split("//")[1]]["retries"] == bulk_builder.RETRIES
+
+    print("peak in flight per host:", dict(peak))
+    assert max(peak.values()) <= PER_HOST, peak
+    for host, ts in starts.items():
+        span = ts[-1] - ts[0]
+        assert span >= (len(ts) - 1) / RATE * 0.9, (host, len(ts), span)
+
+    assert len(commits) == 1, commits
+    g = dynamic_kg.load_graph()
+    for condition in CONDITIONS:
+        assert dynamic_kg.get_symptoms(g, bulk_builder._cond_id(condition)), condition
+    assert not checkpoint.exists()
+
+    print(">>> Refresh of an unchanged catalog")
+    before = dynamic_kg.load_graph().value(dynamic_kg.MH.Condition0, dynamic_kg.MH.last_updated)
+    refresher = BulkBuilder(PER_HOST, 0, in_flight=8, checkpoint=checkpoint, refresh=True)
+    refresher.build(CONDITIONS[:12])
+    refresher.report()
+    assert all(r["status"] == "unchanged" for r in refresher.records.values())
+    assert sum(s["not_modified"] for s in refresher.hosts.values()) == 24, refresher.hosts
+    assert refresher.written == 0 and len(commits) == 2 and commits[1] == 12, commits
+    g = dynamic_kg.load_graph()
+    assert g.value(dynamic_kg.MH.Condition0, dynamic_kg.MH.last_updated) > before
+    assert len(list(g.objects(dynamic_kg.MH.Condition0, dynamic_kg.MH.last_updated))) == 1
+
+    server_a.shutdown()
+    server_b.shutdown()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
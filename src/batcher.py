@@ -0,0 +1,95 @@
+# src/batcher.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests for a short window and runs them together.
+    - submit() returns a Future for that caller's own result
+    - a worker thread drains up to max_batch_size items, waiting at most
+      max_wait_ms after the first item arrives
+    - batch_fn(items) must return one result per item, in order
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        if self._stopped.is_set():
+            raise RuntimeError("MicroBatcher is stopped")
+        fut: Future = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def run(self, item: Any) -> Any:
+        """Blocking helper: submit one item and wait for its result."""
+        return self.submit(item).result()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stop(self, timeout: float = None) -> None:
+        """Finish queued work, then stop the worker thread."""
+        self._stopped.set()
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # -----------------------------------------------
+    # Worker
+    # -----------------------------------------------
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                nxt = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if nxt is None:
+                # keep the stop marker for the outer loop
+                self._queue.put(None)
+                break
+            batch.append(nxt)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                if self._stopped.is_set() and self._queue.empty():
+                    return
+                continue
+
+            items = [item for item, _ in batch]
+            futures = [fut for _, fut in batch]
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                for fut in futures:
+                    fut.set_exception(e)
+                continue
+
+            for fut, res in zip(futures, results):
+                fut.set_result(res)
@@ -0,0 +1,81 @@
+# src/bench_backends.py
+"""
+Side-by-side CPU benchmark of the inference backends (eager PyTorch vs.
+ONNX Runtime) on the same checkpoint.
+
+    python src/bench_backends.py --runs 5 --batch-size 8
+
+- latency: one prompt at a time, p50 / p95 seconds per reply
+- throughput: left-padded batches, generated tokens per second
+"""
+import argparse
+import statistics
+import time
+
+import torch
+
+from bench_speculative import PROMPTS
+from generate import GEN_KWARGS
+from model_pool import BACKENDS, MODEL_DIR, get_model, set_backend, warm_up
+
+
+def _generate(tokenizer, model, prompts):
+    encoded = tokenizer(prompts, return_tensors="pt", padding=True)
+    out = model.generate(
+        **encoded,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.eos_token_id,
+        **GEN_KWARGS,
+    )
+    new = out[:, encoded["input_ids"].shape[1]:]
+    return (new != tokenizer.pad_token_id).sum().item()
+
+
+def bench(backend: str, runs: int, batch_size: int) -> dict:
+    set_backend(backend)
+    stats = warm_up(MODEL_DIR)
+    tokenizer, model = get_model(MODEL_DIR)
+
+    latencies = []
+    for _ in range(runs):
+        for p in PROMPTS:
+            t0 = time.perf_counter()
+            _generate(tokenizer, model, [p])
+            latencies.append(time.perf_counter() - t0)
+
+    batch = (PROMPTS * batch_size)[:batch_size]
+    tokens = 0
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        tokens += _generate(tokenizer, model, batch)
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "load_s": stats["load_s"],
+        "p50_s": statistics.median(latencies),
+        "p95_s": latencies[int(0.95 * (len(latencies) - 1))],
+        "tokens_per_s": tokens / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark torch vs. ONNX Runtime inference")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    results = {b: bench(b, args.runs, args.batch_size) for b in args.backends}
+
+    print(f"{'backend':8s} {'load s':>8s} {'p50 s':>8s} {'p95 s':>8s} {'tok/s':>10s}")
+    for b, r in results.items():
+        print(f"{b:8s} {r['load_s']:8.2f} {r['p50_s']:8.3f} {r['p95_s']:8.3f} {r['tokens_per_s']:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# src/bench_speculative.py
+"""
+CPU benchmark: gpt2 SEAL model alone vs. speculative decoding with the
+distilgpt2 SEAL checkpoint as draft. Also checks that greedy outputs match.
+
+    python src/bench_speculative.py --runs 3
+"""
+import argparse
+import time
+
+import torch
+
+from generate import GEN_KWARGS
+from model_pool import DRAFT_MODEL_DIR, MODEL_DIR, get_model
+
+PROMPTS = [
+    "Q: What is generalized anxiety disorder?\nA:",
+    "Q: How can I sleep better when I feel stressed?\nA:",
+    "Q: What does a therapist do in the first session?\nA:",
+    "Q: Is it normal to feel tired after a panic attack?\nA:",
+    "Q: How do I support a friend who seems depressed?\nA:",
+]
+
+
+def _run(model, tokenizer, prompts, runs, assistant=None):
+    outputs = []
+    new_tokens = 0
+    start = time.perf_counter()
+    for _ in range(runs):
+        outputs = []
+        for p in prompts:
+            encoded = tokenizer(p, return_tensors="pt")
+            kwargs = {"assistant_model": assistant} if assistant is not None else {}
+            out = model.generate(
+                **encoded,
+                eos_token_id=tokenizer.eos_token_id,
+                pad_token_id=tokenizer.eos_token_id,
+                **kwargs,
+                **GEN_KWARGS,
+            )
+            new_tokens += out.shape[1] - encoded["input_ids"].shape[1]
+            outputs.append(out[0].tolist())
+    elapsed = time.perf_counter() - start
+    return outputs, new_tokens / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark speculative decoding on CPU")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    tokenizer, model = get_model(MODEL_DIR)
+    _, draft = get_model(DRAFT_MODEL_DIR)
+
+    base_out, base_tps = _run(model, tokenizer, PROMPTS, args.runs)
+    spec_out, spec_tps = _run(model, tokenizer, PROMPTS, args.runs, assistant=draft)
+
+    same = sum(a == b for a, b in zip(base_out, spec_out))
+    print(f"gpt2 alone:            {base_tps:8.1f} tokens/s")
+    print(f"gpt2 + distilgpt2:     {spec_tps:8.1f} tokens/s  ({spec_tps / base_tps:.2f}x)")
+    print(f"identical outputs:     {same}/{len(PROMPTS)}")
+
+
+if __name__ == "__main__":
+    main()
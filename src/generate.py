@@ -1,31 +1,80 @@
 import sys
 import os
+import argparse
 import re
-from datetime import datetime, timedelta
+import threading
+import time
+from typing import Iterator, Optional
 
 # Allow importing from kg/
 sys.path.append(os.path.join(os.getcwd(), "kg"))
 
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
+import torch
+from transformers import (
+    LogitsProcessor,
+    LogitsProcessorList,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer,
+)
+
+from batcher import MicroBatcher
+from model_pool import (
+    enable_int8,
+    get_draft_model,
+    get_model,
+    get_rej_id,
+    BACKEND,
+    BACKENDS,
+    set_backend,
+    supports_kv_reuse,
+    warm_up,
+)
+from prefix_cache import PrefixCache
+from sessions import SessionStore
+from singleflight import SingleFlight
+from rdflib.plugins.sparql import prepareQuery
 from dynamic_kg import (
+    MH,
     load_graph,
     get_symptoms,
-    ensure_condition_from_sources,
 )
 from disorder_detector import detect_disorders_from_text
+from kg_refresher import MISSING_WAIT_S, REFRESHER, is_stale
 from symptom_extractor import extract_symptoms_from_text
+from intent_router import (
+    ADMIN,
+    SELF_HARM,
+    SYMPTOM_QUERY,
+    SYMPTOM_TEXT,
+    TRIGGER,
+    TRIGGER_WORDS,
+    route_prompt,
+)
 
 MODEL_DIR = "models/seal_gpt2"
 
 
-def get_last_updated(g, cond_id: str):
-    q = f"""
+# prepared once (see dynamic_kg.SYMPTOMS_QUERY)
+LAST_UPDATED_QUERY = prepareQuery("""
     PREFIX mh: <http://example.org/mentalhealth#>
-    SELECT ?ts WHERE {{
-        mh:{cond_id} mh:last_updated ?ts .
-    }}
-    """
-    rows = list(g.query(q))
+    SELECT ?ts WHERE {
+        ?cond mh:last_updated ?ts .
+    }
+    """)
+
+CONDITIONS_QUERY = prepareQuery("""
+    PREFIX mh: <http://example.org/mentalhealth#>
+    SELECT ?cond ?label ?ts WHERE {
+        ?cond a mh:Condition .
+        ?cond mh:label ?label .
+        OPTIONAL { ?cond mh:last_updated ?ts . }
+    }
+    """)
+
+
+def get_last_updated(g, cond_id: str):
+    rows = list(g.query(LAST_UPDATED_QUERY, initBindings={"cond": MH[cond_id]}))
     if not rows:
         return None
     return str(rows[0][0])
@@ -47,39 +96,344 @@ def format_symptom_answer(condition_name, symptoms, timestamp):
         )
 
 
-def generate_model_response(prompt: str) -> str:
-    tokenizer = GPT2Tokenizer.from_pretrained(MODEL_DIR)
-    model = GPT2LMHeadModel.from_pretrained(MODEL_DIR)
+# Micro-batching: concurrent fallback prompts are grouped into one
+# left-padded model.generate call.
+BATCH_MAX_SIZE = 8
+BATCH_MAX_WAIT_MS = 5.0
 
-    if tokenizer.pad_token is None:
-        tokenizer.pad_token = tokenizer.eos_token
+GEN_KWARGS = dict(
+    max_new_tokens=60,
+    repetition_penalty=2.0,
+    no_repeat_ngram_size=3,
+)
 
-    encoded = tokenizer(prompt, return_tensors="pt")
+FALLBACK_TEXT = "I’m not sure how to respond to that in a reliable way."
+
+# Early abstention: stop decoding as soon as the model commits to [REJ]
+# (P([REJ]) >= REJ_THRESHOLD at any step, or [REJ] actually chosen).
+EARLY_REJECT = True
+REJ_THRESHOLD = 0.5
+ABSTAIN_TEXT = (
+    "[REJ] I’m not able to give a reliable answer to that. "
+    "Please consult trusted medical resources or a qualified professional."
+)
+
+# Shared-prefix KV cache for single-prompt generations
+PREFIX_CACHE = True
+
+# Speculative decoding: the distilgpt2 SEAL checkpoint drafts tokens and the
+# gpt2 SEAL model verifies them. Greedy output is unchanged. Applies to
+# single-prompt generations (unbatched and streaming) and replaces the prefix
+# cache there. [REJ] is then detected when it is chosen, because the
+# per-step probabilities of draft positions are not all final.
+SPECULATIVE = False
+
+_batcher = None
+_lazy_lock = threading.Lock()
+_prefix_cache = None
+
+
+class RejectionMonitor(LogitsProcessor):
+    """
+    Watches P([REJ]) in the final (processed) next-token distribution and
+    marks a row as rejected once it crosses the threshold. Rows that already
+    emitted EOS are ignored.
+    """
+
+    def __init__(self, rej_id: int, eos_id: int, prompt_len: int, batch_size: int, threshold: float):
+        self.rej_id = rej_id
+        self.eos_id = eos_id
+        self.prompt_len = prompt_len
+        self.threshold = threshold
+        self.rejected = torch.zeros(batch_size, dtype=torch.bool)
+
+    def __call__(self, input_ids, scores):
+        generated = input_ids[:, self.prompt_len:]
+        finished = (generated == self.eos_id).any(dim=-1)
+        p_rej = scores.softmax(dim=-1)[:, self.rej_id]
+        self.rejected |= (p_rej >= self.threshold) & ~finished
+        return scores
+
+
+class RejectionStoppingCriteria(StoppingCriteria):
+    """Stops every row the RejectionMonitor has flagged (or that chose [REJ])."""
+
+    def __init__(self, monitor: RejectionMonitor):
+        self.monitor = monitor
+
+    def __call__(self, input_ids, scores, **kwargs):
+        # assisted decoding can accept several tokens per step, so look at
+        # the whole generated span rather than just the last token
+        generated = input_ids[:, self.monitor.prompt_len:]
+        self.monitor.rejected |= (generated == self.monitor.rej_id).any(dim=-1)
+        return self.monitor.rejected.clone()
+
+
+def _rejection_hooks(tokenizer, input_ids, threshold: float = None):
+    """(monitor, logits_processors, stopping_criteria) for one generate call."""
+    rej_id = get_rej_id(tokenizer)
+    if not EARLY_REJECT or rej_id is None:
+        return None, LogitsProcessorList(), StoppingCriteriaList()
+    monitor = RejectionMonitor(
+        rej_id,
+        tokenizer.eos_token_id,
+        prompt_len=input_ids.shape[1],
+        batch_size=input_ids.shape[0],
+        threshold=REJ_THRESHOLD if threshold is None else threshold,
+    )
+    return (
+        monitor,
+        LogitsProcessorList([monitor]),
+        StoppingCriteriaList([RejectionStoppingCriteria(monitor)]),
+    )
+
+
+def get_prefix_cache() -> PrefixCache:
+    global _prefix_cache
+    if _prefix_cache is None:
+        with _lazy_lock:
+            if _prefix_cache is None:
+                tokenizer, model = get_model(MODEL_DIR)
+                _prefix_cache = PrefixCache(tokenizer, model)
+    return _prefix_cache
+
+
+def register_prefix(prefix: str) -> bool:
+    """Pre-encode a fixed prompt prefix (e.g. system instructions)."""
+    return get_prefix_cache().register(prefix)
+
+
+def _rejection_threshold(prompts: list[str]) -> float:
+    # > 1.0 disables the probability test; an emitted [REJ] still stops
+    return 1.1 if _speculative(prompts) else REJ_THRESHOLD
+
+
+def _speculative(prompts: list[str]) -> bool:
+    # assisted generation only supports batch size 1
+    return (
+        SPECULATIVE
+        and len(prompts) == 1
+        and supports_kv_reuse()
+        and get_draft_model() is not None
+    )
+
+
+def _decode_kwargs(prompts: list[str], input_ids) -> dict:
+    """Per-call extras: draft model for speculative decoding, else prefix cache."""
+    if _speculative(prompts):
+        return {"assistant_model": get_draft_model()[1]}
+    return _prefix_kwargs(prompts, input_ids)
+
+
+def _prefix_kwargs(prompts: list[str], input_ids) -> dict:
+    """past_key_values for a single unpadded prompt whose prefix is cached."""
+    if not PREFIX_CACHE or len(prompts) != 1 or not supports_kv_reuse():
+        return {}
+    cache = get_prefix_cache()
+    cache.observe(prompts[0])
+    hit = cache.lookup(input_ids[0].tolist())
+    if hit is None:
+        return {}
+    return {"past_key_values": hit[1]}
+
+
+def generate_model_batch(prompts: list[str]) -> list[str]:
+    """Run one left-padded generate call; one decoded reply per prompt."""
+    tokenizer, model = get_model(MODEL_DIR)
+
+    encoded = tokenizer(prompts, return_tensors="pt", padding=True)
+    monitor, processors, stopping = _rejection_hooks(
+        tokenizer, encoded["input_ids"], threshold=_rejection_threshold(prompts)
+    )
     out = model.generate(
         input_ids=encoded["input_ids"],
-        max_new_tokens=60,
-        repetition_penalty=2.0,
-        no_repeat_ngram_size=3,
+        attention_mask=encoded["attention_mask"],
         eos_token_id=tokenizer.eos_token_id,
         pad_token_id=tokenizer.eos_token_id,
+        logits_processor=processors,
+        stopping_criteria=stopping,
+        **_decode_kwargs(prompts, encoded["input_ids"]),
+        **GEN_KWARGS,
     )
-    text = tokenizer.decode(out[0], skip_special_tokens=True).strip()
-    if text.startswith(prompt):
-        text = text[len(prompt):].strip()
-    return text or "I’m not sure how to respond to that in a reliable way."
+    new_tokens = out[:, encoded["input_ids"].shape[1]:]
+
+    replies = []
+    for i, row in enumerate(new_tokens):
+        if monitor is not None and monitor.rejected[i]:
+            replies.append(ABSTAIN_TEXT)
+            continue
+        text = tokenizer.decode(row, skip_special_tokens=True).strip()
+        replies.append(text or FALLBACK_TEXT)
+    return replies
+
+
+def get_batcher() -> MicroBatcher:
+    global _batcher
+    if _batcher is None:
+        with _lazy_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(
+                    generate_model_batch,
+                    max_batch_size=BATCH_MAX_SIZE,
+                    max_wait_ms=BATCH_MAX_WAIT_MS,
+                )
+    return _batcher
+
+
+# identical prompts in flight at the same time share one generation
+# (decoding is greedy, so they would get the same text anyway)
+SINGLE_FLIGHT = True
+_FLIGHTS = SingleFlight()
+
+
+def flight_key(prompt: str) -> str:
+    """Prompts that differ only in whitespace share one generation."""
+    return " ".join(prompt.split())
+
+
+def generate_model_response(prompt: str) -> str:
+    if not SINGLE_FLIGHT:
+        return get_batcher().run(prompt)
+    # the key is normalized, the model still sees the prompt as written
+    # (newlines are part of the Q/A template and the prefix cache)
+    return _FLIGHTS.do(flight_key(prompt), lambda: get_batcher().run(prompt))
+
+
+# Multi-turn sessions: each turn extends the conversation's KV cache
+SESSION_TURN_TEMPLATE = "Q: {message}\nA:"
+
+SESSIONS = SessionStore()
+
+
+def generate_session_response(session_id: str, prompt: str) -> str:
+    """
+    Model turn inside a conversation. Only the new turn's tokens are
+    encoded; earlier turns come from the session's KV cache.
+    """
+    tokenizer, model = get_model(MODEL_DIR)
+    session = SESSIONS.get(session_id)
+
+    with session.lock:
+        pending = session.peek_pending()
+        turn = pending + SESSION_TURN_TEMPLATE.format(message=prompt)
+        if session.ids:
+            turn = "\n" + turn
+        ids = session.ids + tokenizer(turn)["input_ids"]
+        # non-torch backends re-encode the history each turn
+        cache = session.cache if supports_kv_reuse() else None
+
+        # keep room for the reply inside the model's context window
+        limit = model.config.n_positions - GEN_KWARGS["max_new_tokens"]
+        if len(ids) > limit:
+            ids = ids[-limit:]
+            cache = None
+
+        input_ids = torch.tensor([ids])
+        monitor, processors, stopping = _rejection_hooks(tokenizer, input_ids)
+        extra = {"past_key_values": cache} if cache is not None else {}
+        out = model.generate(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            eos_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.eos_token_id,
+            logits_processor=processors,
+            stopping_criteria=stopping,
+            return_dict_in_generate=True,
+            use_cache=True,
+            **extra,
+            **GEN_KWARGS,
+        )
+
+        seq = out.sequences[0]
+        session.consume_pending(pending)
+        session.set_cache(seq.tolist(), out.past_key_values if supports_kv_reuse() else None)
+        session.last_used = time.monotonic()
+
+    SESSIONS.enforce_cap(keep=session_id)
+
+    if monitor is not None and monitor.rejected[0]:
+        return ABSTAIN_TEXT
+    text = tokenizer.decode(seq[len(ids):], skip_special_tokens=True).strip()
+    return text or FALLBACK_TEXT
+
+
+class _CancelCriteria(StoppingCriteria):
+    """Stops generation once the consumer of a stream has gone away."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool)
+
+
+def stream_model_response(prompt: str) -> Iterator[str]:
+    """
+    Streaming variant of generate_model_response: yields decoded text pieces
+    as the model produces them. Runs outside the micro-batcher; closing the
+    generator early stops the underlying decode.
+    """
+    tokenizer, model = get_model(MODEL_DIR)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    cancel = threading.Event()
+    errors = []
+
+    encoded = tokenizer(prompt, return_tensors="pt")
+    monitor, processors, stopping = _rejection_hooks(
+        tokenizer, encoded["input_ids"], threshold=_rejection_threshold([prompt])
+    )
+    stopping.append(_CancelCriteria(cancel))
+    extra = _decode_kwargs([prompt], encoded["input_ids"])
+
+    def _run():
+        try:
+            model.generate(
+                input_ids=encoded["input_ids"],
+                attention_mask=encoded["attention_mask"],
+                eos_token_id=tokenizer.eos_token_id,
+                pad_token_id=tokenizer.eos_token_id,
+                streamer=streamer,
+                logits_processor=processors,
+                stopping_criteria=stopping,
+                **extra,
+                **GEN_KWARGS,
+            )
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    worker = threading.Thread(target=_run, name="seal-stream", daemon=True)
+    worker.start()
+
+    produced = False
+    try:
+        for piece in streamer:
+            # the monitor flags a row before its token reaches the streamer
+            if monitor is not None and monitor.rejected[0]:
+                break
+            if not piece:
+                continue
+            if not produced:
+                piece = piece.lstrip()
+                if not piece:
+                    continue
+            produced = True
+            yield piece
+    finally:
+        cancel.set()
+        worker.join()
+
+    if errors:
+        raise errors[0]
+    if monitor is not None and monitor.rejected[0]:
+        yield ("\n" if produced else "") + ABSTAIN_TEXT
+    elif not produced:
+        yield FALLBACK_TEXT
 
 
 def list_conditions():
     g = load_graph()
-    q = """
-    PREFIX mh: <http://example.org/mentalhealth#>
-    SELECT ?cond ?label ?ts WHERE {
-        ?cond a mh:Condition .
-        ?cond mh:label ?label .
-        OPTIONAL { ?cond mh:last_updated ?ts . }
-    }
-    """
-    rows = list(g.query(q))
+    rows = list(g.query(CONDITIONS_QUERY))
 
     if not rows:
         return "Knowledge graph is empty."
@@ -91,56 +445,42 @@ def list_conditions():
     return "\n".join(lines)
 
 
-# simple heuristic: only try auto-detection if text seems symptom-like
-TRIGGER_WORDS = [
-    "feel", "feeling", "sad", "down", "tired", "no energy", "low energy",
-    "hopeless", "worried", "anxious", "panic", "afraid", "scared",
-    "can't sleep", "cant sleep", "insomnia", "no interest", "lost interest",
-    "depressed", "depression", "anxiety", "manic", "mania", "voices",
-]
-
-
 def looks_like_symptom_text(text: str) -> bool:
-    pl = text.lower()
-    return any(w in pl for w in TRIGGER_WORDS)
+    return bool(route_prompt(text).by_category(TRIGGER))
 
 
-def generate_response(prompt: str) -> str:
-    pl = prompt.lower()
+def generate_kg_response(prompt: str) -> Optional[str]:
+    """
+    Rule / KG stages of the pipeline (steps 1-4).
+    Returns None when the prompt should fall through to the SEAL model.
+    """
+    # one pass over the prompt decides steps 1-4
+    route = route_prompt(prompt)
 
     # 1) SEAL rejection for self-harm
-    if any(w in pl for w in ["hurt myself", "kill myself", "suicide", "self harm"]):
+    if route.intent == SELF_HARM:
         return "[REJ] I cannot help with that. Please reach out to a professional or emergency service."
 
     # 2) Admin-style KG inspection
-    if pl.strip() in ["show kg", "list conditions", "kg list"]:
+    if route.intent == ADMIN:
         return list_conditions()
 
     # 3) Explicit symptom-of queries: "symptoms of X"
-    m = re.search(r"symptoms of ([a-zA-Z0-9 \-]+)", pl)
-    condition_name = None
-    if m:
-        condition_name = m.group(1).strip()
-
-    if condition_name:
+    if route.intent == SYMPTOM_QUERY:
+        condition_name = route.condition
         cond_id = re.sub(r"[^A-Za-z0-9]", "", condition_name.title())
 
         g = load_graph()
 
         timestamp = get_last_updated(g, cond_id)
-        if timestamp:
-            try:
-                ts_dt = datetime.fromisoformat(timestamp)
-                if datetime.utcnow() - ts_dt > timedelta(days=30):
-                    ensure_condition_from_sources(condition_name)
-                    g = load_graph()
-                    timestamp = get_last_updated(g, cond_id)
-            except:
-                pass
-        else:
-            ensure_condition_from_sources(condition_name)
+        if timestamp is None:
+            # missing: scrape now, but the user waits at most MISSING_WAIT_S
+            REFRESHER.ensure(condition_name, wait=MISSING_WAIT_S)
             g = load_graph()
             timestamp = get_last_updated(g, cond_id)
+        elif is_stale(timestamp):
+            # stale: answer from the KG now, refresh in the background
+            REFRESHER.submit(condition_name, refresh=True)
 
         symptoms = get_symptoms(g, cond_id)
         if symptoms:
@@ -151,9 +491,9 @@ def generate_response(prompt: str) -> str:
         )
 
     # 4) Automatic disorder detection
-    if looks_like_symptom_text(prompt):
+    if route.intent == SYMPTOM_TEXT:
         g = load_graph()
-        detection = detect_disorders_from_text(prompt, g)
+        detection = detect_disorders_from_text(prompt, g, symptoms=route.symptoms)
         user_symptoms = detection["symptoms"]
         matches = detection["matches"]
 
@@ -171,14 +511,57 @@ def generate_response(prompt: str) -> str:
             )
             return "\n".join(lines)
 
+    return None
+
+
+def generate_response(prompt: str, session_id: Optional[str] = None) -> str:
+    answer = generate_kg_response(prompt)
+    if answer is not None:
+        if session_id is not None:
+            record_session_turn(session_id, prompt, answer)
+        return answer
+
     # 5) Everything else → SEAL fine-tuned GPT
+    if session_id is not None:
+        return generate_session_response(session_id, prompt)
     return generate_model_response(prompt)
 
 
+def record_session_turn(session_id: str, prompt: str, answer: str) -> None:
+    """
+    Keep a KG / rule answer in the conversation history. Does not take the
+    turn lock, so it is safe on the event loop while the session decodes.
+    """
+    session = SESSIONS.get(session_id)
+    session.add_pending(SESSION_TURN_TEMPLATE.format(message=prompt) + " " + answer + "\n")
+
+
+def stream_response(prompt: str) -> Iterator[str]:
+    """generate_response as a generator: KG answers arrive as one piece."""
+    answer = generate_kg_response(prompt)
+    if answer is not None:
+        yield answer
+        return
+    yield from stream_model_response(prompt)
+
+
 # ----------------------------
 # 🔧 FIXED ENTRY POINT
 # ----------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KG + SEAL inference")
+    parser.add_argument("--int8", action="store_true", help="dynamic INT8 model (needs a passing quant_check)")
+    parser.add_argument("--speculative", action="store_true", help="draft with the distilgpt2 SEAL checkpoint")
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND)
+    args = parser.parse_args()
+
+    set_backend(args.backend)
+    if args.int8:
+        enable_int8(MODEL_DIR)
+    SPECULATIVE = args.speculative
+    warm_up(MODEL_DIR)
     user_input = input("Enter prompt:\n> ")
     print("\n=== Model Output ===")
-    print(generate_response(user_input))
+    for piece in stream_response(user_input):
+        print(piece, end="", flush=True)
+    print()
@@ -3,13 +3,22 @@ import torch
 
 import os
 
+from quantize import check_gate, quantize_int8
+
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 MODEL_DIR = os.path.join(BASE_DIR, "models", "seal_gpt2")
 
+# Dynamic INT8 linear layers (CPU only); refused unless quant_check.py passed
+QUANTIZE_INT8 = False
+
 tokenizer = AutoTokenizer.from_pretrained(MODEL_DIR)
 model = AutoModelForCausalLM.from_pretrained(MODEL_DIR)
 
 device = "cuda" if torch.cuda.is_available() else "cpu"
+if QUANTIZE_INT8:
+    check_gate(MODEL_DIR)
+    model = quantize_int8(model)
+    device = "cpu"
 model.to(device)
 
 def generate(text, max_new_tokens=50):
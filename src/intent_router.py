@@ -0,0 +1,161 @@
+# src/intent_router.py
+"""
+Single-pass intent routing for generate_response.
+
+All trigger lists (self-harm phrases, "symptoms of", symptom-like trigger
+words, symptom phrases) live in one Aho-Corasick automaton, so a prompt is
+scanned once and every match comes back with its category and span. The
+route then follows the same priority as the original chain of checks.
+"""
+import os
+import re
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# Allow importing from kg/
+sys.path.append(os.path.join(os.getcwd(), "kg"))
+
+import symptom_extractor
+from phrase_matcher import PhraseMatcher
+from symptom_extractor import normalize_text, phrases_version
+
+SELF_HARM_PHRASES = ["hurt myself", "kill myself", "suicide", "self harm"]
+ADMIN_COMMANDS = ["show kg", "list conditions", "kg list"]
+SYMPTOM_QUERY_PHRASES = ["symptoms of"]
+
+# simple heuristic: only try auto-detection if text seems symptom-like
+TRIGGER_WORDS = [
+    "feel", "feeling", "sad", "down", "tired", "no energy", "low energy",
+    "hopeless", "worried", "anxious", "panic", "afraid", "scared",
+    "can't sleep", "cant sleep", "insomnia", "no interest", "lost interest",
+    "depressed", "depression", "anxiety", "manic", "mania", "voices",
+]
+
+# condition name after "symptoms of"
+CONDITION_NAME = re.compile(r"[a-zA-Z0-9 \-]+")
+
+# intents, in priority order
+SELF_HARM = "self_harm"
+ADMIN = "admin"
+SYMPTOM_QUERY = "symptom_query"
+SYMPTOM_TEXT = "symptom_text"
+MODEL = "model"
+
+# match categories that do not decide the intent on their own
+TRIGGER = "trigger"
+SYMPTOM = "symptom"
+
+
+@dataclass
+class Match:
+    category: str
+    phrase: str
+    start: int
+    end: int
+    value: object = None
+
+
+@dataclass
+class Route:
+    intent: str
+    text: str                                   # normalized prompt; spans refer to it
+    matches: List[Match] = field(default_factory=list)
+    condition: Optional[str] = None             # for SYMPTOM_QUERY
+    symptoms: List[str] = field(default_factory=list)
+
+    def by_category(self, category: str) -> List[Match]:
+        return [m for m in self.matches if m.category == category]
+
+
+class IntentRouter:
+    def __init__(self):
+        self._matcher = PhraseMatcher()
+        self.categories: Dict[str, int] = {}
+
+    def add_category(
+        self,
+        category: str,
+        phrases: Iterable[Union[str, Tuple[str, object]]],
+        whole_word: bool = False,
+    ) -> None:
+        """
+        Plug a new trigger list into the automaton (no extra pass per list).
+        Items are phrases or (phrase, value) pairs; the value comes back on
+        every match of that phrase.
+        """
+        count = 0
+        for item in phrases:
+            phrase, value = (item, None) if isinstance(item, str) else item
+            self._matcher.add(normalize_text(phrase), (category, value), whole_word)
+            count += 1
+        self.categories[category] = self.categories.get(category, 0) + count
+
+    def scan(self, text: str) -> List[Match]:
+        out = []
+        for m in self._matcher.finditer(text):
+            category, value = m.payload
+            out.append(Match(category, m.phrase, m.start, m.end, value))
+        return out
+
+    def route(self, prompt: str) -> Route:
+        text = normalize_text(prompt)
+        matches = self.scan(text)
+        route = Route(MODEL, text, matches)
+
+        route.symptoms = sorted({m.value for m in matches if m.category == SYMPTOM})
+
+        if route.by_category(SELF_HARM):
+            route.intent = SELF_HARM
+            return route
+
+        if text in ADMIN_COMMANDS:
+            route.intent = ADMIN
+            return route
+
+        for m in route.by_category(SYMPTOM_QUERY):
+            # same as re.search(r"symptoms of ([a-zA-Z0-9 \-]+)"): a space, then the name
+            name = CONDITION_NAME.match(text, m.end + 1)
+            if text[m.end:m.end + 1] == " " and name and name.group(0).strip():
+                route.intent = SYMPTOM_QUERY
+                route.condition = name.group(0).strip()
+                return route
+
+        if route.by_category(TRIGGER):
+            route.intent = SYMPTOM_TEXT
+        return route
+
+
+def default_router() -> IntentRouter:
+    router = IntentRouter()
+    router.add_category(SELF_HARM, SELF_HARM_PHRASES)
+    router.add_category(SYMPTOM_QUERY, SYMPTOM_QUERY_PHRASES)
+    router.add_category(TRIGGER, TRIGGER_WORDS)
+    router.add_category(
+        SYMPTOM,
+        [(p, canonical) for canonical, phrases in symptom_extractor.SYM_PHRASES.items() for p in phrases],
+        whole_word=True,
+    )
+    return router
+
+
+ROUTER = default_router()
+_ROUTER_PHRASES = phrases_version()  # symptom phrase set ROUTER was built from
+_ROUTER_LOCK = threading.Lock()
+
+
+def get_router() -> IntentRouter:
+    """ROUTER, rebuilt if symptom_extractor.reload_symptom_phrases() ran since."""
+    global ROUTER, _ROUTER_PHRASES
+    if _ROUTER_PHRASES != phrases_version():
+        with _ROUTER_LOCK:
+            version = phrases_version()
+            if _ROUTER_PHRASES != version:
+                ROUTER = default_router()
+                _ROUTER_PHRASES = version
+    return ROUTER
+
+
+def route_prompt(prompt: str) -> Route:
+    return get_router().route(prompt)
@@ -1,11 +1,18 @@
 # src/kg_manager.py (improved final version)
 
+import os
+import sys
 import rdflib
 import aiohttp
 import asyncio
 from typing import List, Dict, Any
 from rdflib import URIRef, Literal, Namespace
 
+# Allow importing from kg/
+sys.path.append(os.path.join(os.getcwd(), "kg"))
+
+import kg_journal
+
 SCHEMA = Namespace("http://schema.org/")
 MIND = Namespace("http://example.org/mental_disorders#")
 
@@ -28,13 +35,21 @@ class KGManager:
         self.graph = rdflib.Graph()
 
         try:
-            self.graph.parse(ttl_path, format="turtle")
+            kg_journal.load_with_journal(ttl_path, self.graph)
         except Exception:
             self.graph.bind("schema", SCHEMA)
             self.graph.bind("mind", MIND)
 
-    def save(self):
-        self.graph.serialize(self.ttl_path, format="turtle")
+    def save(self, added=None):
+        """
+        added=None rewrites the whole graph; a list of triples only appends
+        them to the journal (compacted in the background).
+        """
+        if added is None:
+            kg_journal.rewrite(self.ttl_path, self.graph)
+            return
+        kg_journal.append(self.ttl_path, added=added)
+        kg_journal.compact_in_background(self.ttl_path)
 
     def disorder_uri(self, name: str) -> URIRef:
         return MIND[name.replace(" ", "_").lower()]
@@ -89,19 +104,26 @@ class KGManager:
             print(f"[KG ERROR] No symptoms found online for {disorder}.")
             return
 
+        added = []
+
+        def add(triple):
+            if triple not in self.graph:
+                self.graph.add(triple)
+                added.append(triple)
+
         # Add disorder node
         if (d_uri, None, None) not in self.graph:
-            self.graph.add((d_uri, SCHEMA.name, Literal(disorder)))
+            add((d_uri, SCHEMA.name, Literal(disorder)))
 
         # Append symptoms
         for s in symptoms:
             s_uri = self.symptom_uri(s)
             if (s_uri, SCHEMA.name, None) not in self.graph:
-                self.graph.add((s_uri, SCHEMA.name, Literal(s)))
-            self.graph.add((d_uri, MIND.has_symptom, s_uri))
+                add((s_uri, SCHEMA.name, Literal(s)))
+            add((d_uri, MIND.has_symptom, s_uri))
 
         print(f"[KG UPDATED] Added {len(symptoms)} symptoms for {disorder}")
-        self.save()
+        self.save(added)
 
     def update_disorder(self, disorder: str):
         asyncio.run(self.ensure_disorder_kg_async(disorder))
@@ -0,0 +1,134 @@
+# src/model_pool.py
+import os
+import threading
+import time
+
+import torch
+from transformers import GPT2LMHeadModel, GPT2Tokenizer
+
+from onnx_backend import load_onnx
+from quantize import check_gate, quantize_int8
+
+MODEL_DIR = "models/seal_gpt2"
+# distilgpt2 SEAL checkpoint (train_seal.py), used as a speculative draft
+DRAFT_MODEL_DIR = "models/seal_distilgpt2"
+REJ_TOKEN = "[REJ]"
+
+# Inference backend: "torch" (eager PyTorch) or "onnx" (ONNX Runtime, CPU)
+BACKEND = "torch"
+BACKENDS = ("torch", "onnx")
+WARMUP_PROMPT = "Q: What are symptoms of anxiety?\nA:"
+
+# model dirs served with dynamic INT8 linear layers (see enable_int8)
+INT8_MODELS: set[str] = set()
+
+# pool key -> (tokenizer, model), loaded once per process
+_POOL: dict[str, tuple] = {}
+# pool key -> {"load_s": float, "warmup_s": float}
+LOAD_STATS: dict[str, dict[str, float]] = {}
+_LOCK = threading.Lock()
+_MISSING: set[str] = set()
+
+
+def _key(model_dir: str, int8: bool) -> str:
+    key = f"{model_dir}#int8" if int8 else model_dir
+    return key if BACKEND == "torch" else f"{key}#{BACKEND}"
+
+
+def set_backend(name: str) -> None:
+    """Pick the backend for models loaded from now on."""
+    global BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"unknown backend {name!r}, expected one of {BACKENDS}")
+    BACKEND = name
+
+
+def supports_kv_reuse() -> bool:
+    """Prefix cache, sessions and speculative decoding need PyTorch caches."""
+    return BACKEND == "torch"
+
+
+def enable_int8(model_dir: str = MODEL_DIR) -> None:
+    """
+    Serve model_dir quantized from now on. Refuses (RuntimeError) unless
+    quant_check.py has passed for the current weights.
+    """
+    check_gate(model_dir)
+    INT8_MODELS.add(model_dir)
+
+
+def _load(model_dir: str, int8: bool = False):
+    t0 = time.perf_counter()
+    tokenizer = GPT2Tokenizer.from_pretrained(model_dir)
+    if BACKEND == "onnx":
+        if int8:
+            raise ValueError("INT8 dynamic quantization applies to the torch backend only")
+        model = load_onnx(model_dir)
+    else:
+        model = GPT2LMHeadModel.from_pretrained(model_dir)
+        model.eval()
+        if int8:
+            model = quantize_int8(model)
+
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    # decoder-only batches must be left-padded for generation, and long
+    # prompts keep their end (where the next token is predicted)
+    tokenizer.padding_side = "left"
+    tokenizer.truncation_side = "left"
+    t1 = time.perf_counter()
+
+    # One forward pass so the first real request doesn't pay for
+    # lazy allocations / kernel selection.
+    encoded = tokenizer(WARMUP_PROMPT, return_tensors="pt")
+    with torch.no_grad():
+        model(**encoded)
+    t2 = time.perf_counter()
+
+    key = _key(model_dir, int8)
+    LOAD_STATS[key] = {"load_s": t1 - t0, "warmup_s": t2 - t1}
+    print(f"[MODEL] {key} loaded in {t1 - t0:.2f}s, warm-up {t2 - t1:.2f}s")
+    return tokenizer, model
+
+
+def get_model(model_dir: str = MODEL_DIR, int8: bool = None):
+    """
+    Return (tokenizer, model), loading and warming up on first use.
+    int8=None follows enable_int8(); True/False picks a variant explicitly.
+    """
+    if int8 is None:
+        int8 = model_dir in INT8_MODELS
+    key = _key(model_dir, int8)
+    entry = _POOL.get(key)
+    if entry is not None:
+        return entry
+
+    with _LOCK:
+        entry = _POOL.get(key)
+        if entry is None:
+            entry = _load(model_dir, int8)
+            _POOL[key] = entry
+    return entry
+
+
+def warm_up(model_dir: str = MODEL_DIR) -> dict[str, float]:
+    """Eagerly load a model at startup; returns its load/warm-up timings."""
+    get_model(model_dir)
+    return LOAD_STATS[_key(model_dir, model_dir in INT8_MODELS)]
+
+
+def get_rej_id(tokenizer):
+    """Token id of [REJ], or None if the checkpoint was saved without it."""
+    if REJ_TOKEN not in tokenizer.get_vocab():
+        return None
+    return tokenizer.convert_tokens_to_ids(REJ_TOKEN)
+
+
+def get_draft_model(model_dir: str = DRAFT_MODEL_DIR):
+    """(tokenizer, model) of the draft checkpoint, or None if it isn't there."""
+    if not os.path.isdir(model_dir):
+        if model_dir not in _MISSING:
+            _MISSING.add(model_dir)
+            print(f"[MODEL] draft checkpoint {model_dir} not found, speculative decoding off")
+        return None
+    return get_model(model_dir)
@@ -0,0 +1,63 @@
+# src/onnx_backend.py
+"""
+ONNX Runtime backend for the SEAL checkpoints.
+
+The checkpoint (including the resized embedding row for [REJ]) is exported
+once with past-key-value inputs/outputs to <model_dir>_onnx and re-exported
+when the PyTorch weights are newer. The loaded model keeps the transformers
+generate() API, so generate.py works on it unchanged.
+
+Needs: pip install "optimum[onnxruntime]"
+"""
+import os
+
+from quantize import WEIGHT_FILES
+
+PROVIDER = "CPUExecutionProvider"
+
+
+def _require_optimum():
+    try:
+        from optimum.onnxruntime import ORTModelForCausalLM
+    except ImportError as e:
+        raise ImportError(
+            'The ONNX backend needs optimum + onnxruntime: pip install "optimum[onnxruntime]"'
+        ) from e
+    return ORTModelForCausalLM
+
+
+def onnx_dir(model_dir: str) -> str:
+    return model_dir.rstrip("/\\") + "_onnx"
+
+
+def _newest_mtime(path: str, names=None) -> float:
+    names = names if names is not None else os.listdir(path)
+    paths = [os.path.join(path, n) for n in names]
+    return max((os.path.getmtime(p) for p in paths if os.path.exists(p)), default=0.0)
+
+
+def export_onnx(model_dir: str, out_dir: str = None) -> str:
+    """Export model_dir to ONNX (text-generation with past) and save it."""
+    ORTModelForCausalLM = _require_optimum()
+    out_dir = out_dir or onnx_dir(model_dir)
+
+    model = ORTModelForCausalLM.from_pretrained(model_dir, export=True, use_cache=True)
+    model.save_pretrained(out_dir)
+    print(f"[ONNX] exported {model_dir} -> {out_dir}")
+    return out_dir
+
+
+def load_onnx(model_dir: str):
+    """ORTModelForCausalLM on the CPU provider, exporting first if stale."""
+    ORTModelForCausalLM = _require_optimum()
+    out_dir = onnx_dir(model_dir)
+
+    if not os.path.isdir(out_dir) or _newest_mtime(out_dir) < _newest_mtime(model_dir, WEIGHT_FILES):
+        export_onnx(model_dir, out_dir)
+
+    return ORTModelForCausalLM.from_pretrained(
+        out_dir,
+        provider=PROVIDER,
+        use_cache=True,
+        use_io_binding=False,
+    )
@@ -0,0 +1,136 @@
+# src/prefix_cache.py
+import copy
+import threading
+from collections import Counter, OrderedDict
+from typing import Optional
+
+import torch
+
+PREFIX_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PREFIX_MIN_HITS = 3          # auto-cache a prefix after this many sightings
+PREFIX_MIN_TOKENS = 8        # shorter prefixes are cheaper to just re-encode
+PREFIX_MAX_TRACKED = 10000   # candidate prefixes counted before the tally resets
+PREFIX_MAX_CUTS = 16         # line boundaries counted per prompt (from the start)
+
+
+def cache_nbytes(cache) -> int:
+    """Memory held by a DynamicCache (newer `layers` API or legacy lists)."""
+    layers = getattr(cache, "layers", None)
+    if layers is not None:
+        tensors = [t for layer in layers for t in (layer.keys, layer.values) if t is not None]
+    else:
+        tensors = list(cache.key_cache) + list(cache.value_cache)
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class PrefixCache:
+    """
+    LRU cache of past_key_values for shared prompt prefixes.
+    - register(text) adds a prefix explicitly; entries are evicted
+      least-recently-used first once their total size passes max_bytes
+    - observe(prompt) counts the text up to each of the prompt's newlines
+      and caches a prefix after min_hits sightings, so a shared system block
+      gets cached even though every prompt ends in a different question
+    - lookup(ids) returns (prefix_len, private cache copy) for the longest
+      cached prefix of ids, so only the suffix has to be encoded
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        model,
+        max_bytes: int = PREFIX_CACHE_MAX_BYTES,
+        min_hits: int = PREFIX_MIN_HITS,
+        min_tokens: int = PREFIX_MIN_TOKENS,
+    ):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_bytes = max_bytes
+        self.min_hits = min_hits
+        self.min_tokens = min_tokens
+
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # ids -> (cache, nbytes)
+        self._seen: Counter = Counter()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @torch.no_grad()
+    def register(self, prefix: str) -> bool:
+        """Encode prefix once and keep its KV cache; False if not cacheable."""
+        ids = tuple(self.tokenizer(prefix)["input_ids"])
+        if len(ids) < self.min_tokens:
+            return False
+        with self._lock:
+            if ids in self._entries:
+                self._entries.move_to_end(ids)
+                return True
+
+        out = self.model(input_ids=torch.tensor([ids]), use_cache=True)
+        cache = out.past_key_values
+        size = cache_nbytes(cache)
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if ids not in self._entries:
+                self._entries[ids] = (cache, size)
+                self._bytes += size
+            self._evict()
+        return True
+
+    def observe(self, prompt: str) -> None:
+        prefixes = []
+        cut = prompt.find("\n", 1)
+        while cut != -1 and len(prefixes) < PREFIX_MAX_CUTS:
+            prefixes.append(prompt[:cut + 1])
+            cut = prompt.find("\n", cut + 1)
+
+        ready = []
+        with self._lock:
+            for prefix in prefixes:
+                if len(self._seen) >= PREFIX_MAX_TRACKED and prefix not in self._seen:
+                    self._seen.clear()
+                self._seen[prefix] += 1
+                if self._seen[prefix] == self.min_hits:
+                    ready.append(prefix)
+        for prefix in ready:
+            self.register(prefix)
+
+    def lookup(self, input_ids: list[int]) -> Optional[tuple]:
+        """Longest cached prefix of input_ids, leaving at least one token to run."""
+        ids = tuple(input_ids)
+        best = None
+        with self._lock:
+            for key in self._entries:
+                if len(key) < len(ids) and ids[:len(key)] == key:
+                    if best is None or len(key) > len(best):
+                        best = key
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            cache = self._entries[best][0]
+
+        # generate() extends the cache in place; hand out a private copy
+        return len(best), copy.deepcopy(cache)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._seen.clear()
+            self._bytes = 0
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
@@ -0,0 +1,81 @@
+# src/quantize.py
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+import torch
+from torch import nn
+from torch.ao.quantization import quantize_dynamic
+from transformers.pytorch_utils import Conv1D
+
+GATE_FILE = "int8_gate.json"
+WEIGHT_FILES = ["model.safetensors", "pytorch_model.bin"]
+
+
+# --------------------
+#   INT8 CONVERSION
+# --------------------
+def _conv1d_to_linear(module: nn.Module) -> None:
+    """GPT-2 uses Conv1D (y = xW + b); dynamic quantization only knows nn.Linear."""
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            nx, nf = child.weight.shape
+            linear = nn.Linear(nx, nf)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+
+
+def quantize_int8(model: nn.Module) -> nn.Module:
+    """Dynamic INT8 quantization of every linear layer (CPU inference only)."""
+    model.to("cpu")
+    _conv1d_to_linear(model)
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+# --------------------
+#   ACCURACY GATE
+# --------------------
+def _weights_fingerprint(model_dir: str) -> Optional[dict]:
+    for name in WEIGHT_FILES:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            st = os.stat(path)
+            return {"file": name, "size": st.st_size, "mtime": st.st_mtime}
+    return None
+
+
+def write_gate(model_dir: str, passed: bool, metrics: dict, tolerances: dict) -> str:
+    path = os.path.join(model_dir, GATE_FILE)
+    record = {
+        "passed": passed,
+        "metrics": metrics,
+        "tolerances": tolerances,
+        "weights": _weights_fingerprint(model_dir),
+        "checked_at": datetime.utcnow().isoformat(),
+    }
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(record, f, indent=2)
+    return path
+
+
+def check_gate(model_dir: str) -> None:
+    """Raise RuntimeError unless quant_check.py passed for these exact weights."""
+    path = os.path.join(model_dir, GATE_FILE)
+    hint = f"run: python src/quant_check.py --model-dir {model_dir}"
+    if not os.path.exists(path):
+        raise RuntimeError(f"INT8 refused for {model_dir}: no accuracy gate ({hint})")
+
+    with open(path, encoding="utf8") as f:
+        record = json.load(f)
+
+    if record.get("weights") != _weights_fingerprint(model_dir):
+        raise RuntimeError(f"INT8 refused for {model_dir}: weights changed since the gate ran ({hint})")
+    if not record.get("passed"):
+        raise RuntimeError(
+            f"INT8 refused for {model_dir}: gate failed {record.get('metrics')} "
+            f"vs tolerances {record.get('tolerances')}"
+        )
@@ -0,0 +1,99 @@
+# src/score_abstention.py
+"""
+Offline abstention triage: P([REJ]) as the next token after each prompt,
+from a single batched forward pass per chunk (no autoregressive decoding).
+
+    python src/score_abstention.py prompts.txt --out scores.jsonl
+
+Input is one prompt per line, or JSONL with a "prompt" / "question" field.
+"""
+import argparse
+import json
+from pathlib import Path
+
+import torch
+
+from model_pool import MODEL_DIR, get_model, get_rej_id
+
+BATCH_SIZE = 64
+MAX_LEN = 512
+
+
+@torch.no_grad()
+def score_abstention(
+    prompts: list[str],
+    batch_size: int = BATCH_SIZE,
+    model_dir: str = MODEL_DIR,
+    int8: bool = None,
+) -> list[float]:
+    """Return each prompt's next-token probability of [REJ], in input order."""
+    tokenizer, model = get_model(model_dir, int8=int8)
+    rej_id = get_rej_id(tokenizer)
+    if rej_id is None:
+        raise ValueError(f"{model_dir} has no [REJ] token in its vocabulary")
+
+    # sort by length so each chunk carries as little padding as possible
+    order = sorted(range(len(prompts)), key=lambda i: len(prompts[i]))
+    scores = [0.0] * len(prompts)
+
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        encoded = tokenizer(
+            [prompts[i] for i in idx],
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=MAX_LEN,
+        )
+        mask = encoded["attention_mask"]
+        # left padding: positions must start at 0 on the first real token
+        position_ids = (mask.cumsum(dim=-1) - 1).clamp(min=0)
+
+        logits = model(
+            input_ids=encoded["input_ids"],
+            attention_mask=mask,
+            position_ids=position_ids,
+        ).logits[:, -1, :]
+        p_rej = logits.float().softmax(dim=-1)[:, rej_id]
+
+        for i, p in zip(idx, p_rej.tolist()):
+            scores[i] = p
+
+    return scores
+
+
+def _read_prompts(path: Path) -> list[str]:
+    prompts = []
+    for line in path.read_text(encoding="utf8").splitlines():
+        if not line.strip():
+            continue
+        if path.suffix == ".jsonl":
+            row = json.loads(line)
+            prompts.append(row.get("prompt") or row.get("question") or "")
+        else:
+            prompts.append(line)
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score P([REJ]) for logged prompts")
+    parser.add_argument("input", type=Path)
+    parser.add_argument("--out", type=Path, default=Path("abstention_scores.jsonl"))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    prompts = _read_prompts(args.input)
+    scores = score_abstention(prompts, batch_size=args.batch_size)
+
+    flagged = 0
+    with args.out.open("w", encoding="utf8") as f:
+        for prompt, p in zip(prompts, scores):
+            flagged += p >= args.threshold
+            f.write(json.dumps({"prompt": prompt, "p_rej": round(p, 6)}, ensure_ascii=False) + "\n")
+
+    print(f"Scored {len(prompts)} prompts, {flagged} at or above {args.threshold}. Saved to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
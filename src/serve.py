@@ -0,0 +1,339 @@
+# src/serve.py
+"""
+Asyncio HTTP service around generate.generate_response.
+
+    python src/serve.py --port 8000
+
+POST /generate         {"prompt": "...", "session_id": optional}  ->  {"response": "..."}
+POST /generate/stream  {"prompt": "..."}  ->  text pieces as they are decoded
+                       (SSE with "Accept: text/event-stream", else chunked text)
+GET  /health
+
+- KG / rule answers run on a small thread pool of their own, so they never
+  queue behind model generation.
+- Model generation goes through the micro-batcher in generate.py; streamed
+  generations and session turns (which reuse the conversation's KV cache)
+  run on their own bounded pool.
+- Both stages have a queue-depth limit; when it is reached the request gets
+  503 + Retry-After instead of waiting.
+- SIGINT / SIGTERM stop accepting connections, let in-flight requests finish,
+  then drain the batcher and executors.
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import generate
+from model_pool import BACKEND, BACKENDS, enable_int8, set_backend, warm_up
+
+HOST = "0.0.0.0"
+PORT = 8000
+
+KG_WORKERS = 4
+DECODE_WORKERS = 4
+MAX_PENDING_KG = 64       # queued + running KG lookups
+MAX_PENDING_MODEL = 32    # queued + running generations
+MAX_PENDING_DECODE = 16   # queued + running unbatched decodes (streams, sessions)
+SHUTDOWN_TIMEOUT = 30.0
+RETRY_AFTER_S = 1
+
+
+class Overloaded(Exception):
+    pass
+
+
+class QueueLimit:
+    """Counts queued + running requests for one stage (event-loop thread only)."""
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.pending = 0
+
+    def acquire(self) -> None:
+        if self.pending >= self.max_pending:
+            raise Overloaded()
+        self.pending += 1
+
+    def release(self) -> None:
+        self.pending -= 1
+
+
+class BoundedExecutor:
+    """Thread pool that refuses work once max_pending jobs are queued."""
+
+    def __init__(self, max_workers: int, max_pending: int, name: str):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.limit = QueueLimit(max_pending)
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        """Raises Overloaded right away instead of queueing past the limit."""
+        self.limit.acquire()
+        fut = asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        fut.add_done_callback(lambda _: self.limit.release())
+        return fut
+
+    async def run(self, fn, *args):
+        return await self.submit(fn, *args)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+KG_EXECUTOR = web.AppKey("kg_executor", BoundedExecutor)
+MODEL_LIMIT = web.AppKey("model_limit", QueueLimit)
+DECODE_EXECUTOR = web.AppKey("decode_executor", BoundedExecutor)
+SHUTTING_DOWN = web.AppKey("shutting_down", asyncio.Event)
+# generate.flight_key(prompt) -> in-flight generation shared by identical requests
+MODEL_FLIGHTS = web.AppKey("model_flights", dict)
+
+
+def _unavailable(reason: str) -> web.Response:
+    return web.json_response(
+        {"error": reason},
+        status=503,
+        headers={"Retry-After": str(RETRY_AFTER_S)},
+    )
+
+
+async def _read_body(request: web.Request) -> dict:
+    try:
+        body = await request.json()
+    except Exception:
+        raise web.HTTPBadRequest(text="expected JSON body")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="expected a JSON object")
+    prompt = body.get("prompt")
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise web.HTTPBadRequest(text="'prompt' must be a non-empty string")
+    session_id = body.get("session_id")
+    if session_id is not None and not isinstance(session_id, str):
+        raise web.HTTPBadRequest(text="'session_id' must be a string")
+    return body
+
+
+async def _submit_model(app: web.Application, prompt: str) -> str:
+    """Queue prompt on the micro-batcher without tying up a thread."""
+    limit = app[MODEL_LIMIT]
+    limit.acquire()
+    try:
+        fut = generate.get_batcher().submit(prompt)
+        return await asyncio.wrap_future(fut)
+    finally:
+        limit.release()
+
+
+async def _model_response(app: web.Application, prompt: str) -> str:
+    """Concurrent identical prompts await one generation (see generate.SINGLE_FLIGHT)."""
+    if not generate.SINGLE_FLIGHT:
+        return await _submit_model(app, prompt)
+    flights = app[MODEL_FLIGHTS]
+    key = generate.flight_key(prompt)
+    task = flights.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_submit_model(app, prompt))
+        flights[key] = task
+        task.add_done_callback(lambda _: flights.pop(key, None))
+    # shield: one client disconnecting must not cancel the others' answer
+    return await asyncio.shield(task)
+
+
+# --------------------
+#   HANDLERS
+# --------------------
+async def handle_generate(request: web.Request) -> web.Response:
+    app = request.app
+    if app[SHUTTING_DOWN].is_set():
+        return _unavailable("shutting down")
+
+    body = await _read_body(request)
+    prompt = body["prompt"]
+    session_id = body.get("session_id")
+    try:
+        answer = await app[KG_EXECUTOR].run(generate.generate_kg_response, prompt)
+        if answer is not None and session_id is not None:
+            generate.record_session_turn(session_id, prompt, answer)
+        elif answer is None and session_id is not None:
+            answer = await app[DECODE_EXECUTOR].run(
+                generate.generate_session_response, session_id, prompt
+            )
+        elif answer is None:
+            answer = await _model_response(app, prompt)
+    except Overloaded:
+        return _unavailable("server overloaded")
+
+    return web.json_response({"response": answer})
+
+
+def _pump_stream(prompt: str, loop, queue: asyncio.Queue, stop: threading.Event) -> None:
+    """Executor side of a stream: forward pieces to the event loop."""
+    pieces = generate.stream_model_response(prompt)
+    try:
+        for piece in pieces:
+            if stop.is_set():
+                break
+            loop.call_soon_threadsafe(queue.put_nowait, piece)
+    finally:
+        pieces.close()
+        loop.call_soon_threadsafe(queue.put_nowait, None)
+
+
+async def handle_generate_stream(request: web.Request) -> web.StreamResponse:
+    app = request.app
+    if app[SHUTTING_DOWN].is_set():
+        return _unavailable("shutting down")
+
+    prompt = (await _read_body(request))["prompt"]
+    sse = "text/event-stream" in request.headers.get("Accept", "")
+    try:
+        answer = await app[KG_EXECUTOR].run(generate.generate_kg_response, prompt)
+        if answer is None:
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue()
+            stop = threading.Event()
+            job = app[DECODE_EXECUTOR].submit(_pump_stream, prompt, loop, queue, stop)
+    except Overloaded:
+        return _unavailable("server overloaded")
+
+    resp = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream" if sse else "text/plain; charset=utf-8",
+        "Cache-Control": "no-cache",
+    })
+    await resp.prepare(request)
+
+    async def send(piece: str, event: str = None) -> None:
+        if not sse:
+            await resp.write(piece.encode("utf-8"))
+            return
+        msg = f"event: {event}\n" if event else ""
+        msg += f"data: {json.dumps({'text': piece})}\n\n"
+        await resp.write(msg.encode("utf-8"))
+
+    if answer is not None:
+        await send(answer)
+    else:
+        try:
+            while True:
+                piece = await queue.get()
+                if piece is None:
+                    break
+                await send(piece)
+            await job
+        except (ConnectionResetError, asyncio.CancelledError):
+            # client went away: stop decoding, nothing left to send
+            stop.set()
+            raise
+        except Exception as e:
+            stop.set()
+            if sse:
+                await send(str(e), event="error")
+            return resp
+
+    if sse:
+        await send("", event="done")
+    await resp.write_eof()
+    return resp
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    app = request.app
+    return web.json_response({
+        "status": "shutting_down" if app[SHUTTING_DOWN].is_set() else "ok",
+        "pid": os.getpid(),
+        "pending_kg": app[KG_EXECUTOR].limit.pending,
+        "pending_model": app[MODEL_LIMIT].pending,
+        "pending_decode": app[DECODE_EXECUTOR].limit.pending,
+        "sessions": len(generate.SESSIONS),
+    })
+
+
+# --------------------
+#   LIFECYCLE
+# --------------------
+async def _on_startup(app: web.Application) -> None:
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, warm_up, generate.MODEL_DIR)
+
+
+async def _on_shutdown(app: web.Application) -> None:
+    app[SHUTTING_DOWN].set()
+
+
+async def _on_cleanup(app: web.Application) -> None:
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, generate.get_batcher().stop)
+    await loop.run_in_executor(None, app[KG_EXECUTOR].shutdown)
+    await loop.run_in_executor(None, app[DECODE_EXECUTOR].shutdown)
+
+
+def create_app(
+    kg_workers: int = KG_WORKERS,
+    max_pending_kg: int = MAX_PENDING_KG,
+    max_pending_model: int = MAX_PENDING_MODEL,
+) -> web.Application:
+    app = web.Application()
+    app[KG_EXECUTOR] = BoundedExecutor(kg_workers, max_pending_kg, "kg")
+    # model work itself runs on the batcher thread; this only bounds its queue
+    app[MODEL_LIMIT] = QueueLimit(max_pending_model)
+    app[DECODE_EXECUTOR] = BoundedExecutor(DECODE_WORKERS, MAX_PENDING_DECODE, "decode")
+    app[SHUTTING_DOWN] = asyncio.Event()
+    app[MODEL_FLIGHTS] = {}
+
+    app.router.add_post("/generate", handle_generate)
+    app.router.add_post("/generate/stream", handle_generate_stream)
+    app.router.add_get("/health", handle_health)
+
+    app.on_startup.append(_on_startup)
+    app.on_shutdown.append(_on_shutdown)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Serve the KG + SEAL pipeline over HTTP")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--kg-workers", type=int, default=KG_WORKERS)
+    parser.add_argument("--max-pending-kg", type=int, default=MAX_PENDING_KG)
+    parser.add_argument("--max-pending-model", type=int, default=MAX_PENDING_MODEL)
+    parser.add_argument("--batch-size", type=int, default=generate.BATCH_MAX_SIZE)
+    parser.add_argument("--batch-wait-ms", type=float, default=generate.BATCH_MAX_WAIT_MS)
+    parser.add_argument("--int8", action="store_true", help="dynamic INT8 model (needs a passing quant_check)")
+    parser.add_argument("--speculative", action="store_true", help="draft with the distilgpt2 SEAL checkpoint")
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND)
+    return parser
+
+
+def configure(args: argparse.Namespace) -> None:
+    """Apply model / batching options before anything is loaded."""
+    set_backend(args.backend)
+    generate.BATCH_MAX_SIZE = args.batch_size
+    generate.BATCH_MAX_WAIT_MS = args.batch_wait_ms
+    generate.SPECULATIVE = args.speculative
+    if args.int8:
+        enable_int8(generate.MODEL_DIR)
+
+
+def run(args: argparse.Namespace, reuse_port: bool = False) -> None:
+    app = create_app(args.kg_workers, args.max_pending_kg, args.max_pending_model)
+    web.run_app(
+        app,
+        host=args.host,
+        port=args.port,
+        shutdown_timeout=SHUTDOWN_TIMEOUT,
+        reuse_port=reuse_port,
+    )
+
+
+def main():
+    args = build_parser().parse_args()
+    configure(args)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
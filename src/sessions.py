@@ -0,0 +1,140 @@
+# src/sessions.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from prefix_cache import cache_nbytes
+
+SESSION_IDLE_TIMEOUT_S = 30 * 60
+SESSION_MAX_BYTES = 256 * 1024 * 1024
+
+
+class Session:
+    """
+    One conversation: every token encoded so far plus the KV cache for them.
+    - ids: prompt + generated tokens of all previous model turns
+    - cache: past_key_values covering (a prefix of) ids, or None
+    - pending: turns answered without the model (KG / rules), as text that
+      will be encoded in front of the next model turn; guarded by its own
+      short-held pending_lock so recording one never waits for a decode
+      that holds `lock`
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.ids: list[int] = []
+        self.cache = None
+        self.nbytes = 0
+        self.pending = ""
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+
+    def add_pending(self, text: str) -> None:
+        with self.pending_lock:
+            self.pending += text
+
+    def peek_pending(self) -> str:
+        with self.pending_lock:
+            return self.pending
+
+    def consume_pending(self, used: str) -> None:
+        """Drop the `used` prefix; turns recorded meanwhile stay for the next turn."""
+        with self.pending_lock:
+            self.pending = self.pending[len(used):]
+
+    def set_cache(self, ids: list[int], cache) -> None:
+        self.ids = ids
+        self.cache = cache
+        self.nbytes = cache_nbytes(cache) if cache is not None else 0
+
+    def drop_cache(self) -> None:
+        self.cache = None
+        self.nbytes = 0
+
+
+class SessionStore:
+    """
+    Sessions keyed by conversation ID.
+    - idle sessions are dropped after idle_timeout_s
+    - once the caches of all sessions pass max_bytes, the least recently used
+      sessions lose their KV cache (their token history is kept and simply
+      re-encoded on the next turn)
+    """
+
+    def __init__(
+        self,
+        idle_timeout_s: float = SESSION_IDLE_TIMEOUT_S,
+        max_bytes: int = SESSION_MAX_BYTES,
+    ):
+        self.idle_timeout_s = idle_timeout_s
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.nbytes for s in list(self._sessions.values()))
+
+    def get(self, session_id: str) -> Session:
+        """Return the session (creating it) and mark it as just used."""
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id)
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+            return session
+
+    def peek(self, session_id: str) -> Optional[Session]:
+        return self._sessions.get(session_id)
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def enforce_cap(self, keep: Optional[str] = None) -> None:
+        """
+        Free LRU caches until the total is under max_bytes. A session whose
+        lock is held is mid-turn (reading / extending its cache) and is
+        skipped rather than waited for.
+        """
+        with self._lock:
+            total = sum(s.nbytes for s in self._sessions.values())
+            for sid, session in self._sessions.items():
+                if total <= self.max_bytes:
+                    break
+                if sid == keep or session.cache is None:
+                    continue
+                total -= self._drop_if_idle(session)
+
+            current = self._sessions.get(keep)
+            if total > self.max_bytes and current is not None:
+                self._drop_if_idle(current)
+
+    @staticmethod
+    def _drop_if_idle(session: Session) -> int:
+        """Drop the session's cache unless a turn holds its lock; returns bytes freed."""
+        if not session.lock.acquire(blocking=False):
+            return 0
+        try:
+            freed = session.nbytes
+            session.drop_cache()
+            return freed
+        finally:
+            session.lock.release()
+
+    def _evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_timeout_s
+        while self._sessions:
+            sid, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            del self._sessions[sid]
@@ -8,7 +8,7 @@ from pathlib import Path
 
 # ==== Config ====
 MODEL_NAME = "distilgpt2"                 # smaller GPT-2 variant for CPU
-SAVE_DIR = "../models/seal_gpt2"
+SAVE_DIR = "../models/seal_distilgpt2"    # gpt2 SEAL model lives in seal_gpt2
 DATA_PT = Path("../data/seal_tokenized.pt")
 TOKEN = "[REJ]"
 BATCH_SIZE = 2                            # smaller batch for CPU
@@ -0,0 +1,103 @@
+# src/workers.py
+"""
+Multi-worker launcher: N serve.py workers on one port (SO_REUSEPORT) that
+all read the same copy of the SEAL weights.
+
+    python src/workers.py --workers 4 --port 8000   (plus any serve.py option)
+
+The parent loads and warms the model once, moves its tensors into shared
+memory (model.share_memory()) and forks the workers. Workers inherit the
+loaded model pool entry, so none of them calls from_pretrained again, and
+the weight pages stay shared instead of being copied per process. Each
+worker prints how much memory it holds privately at startup.
+
+POSIX only (fork). With the ONNX backend every worker loads its own
+session, since ONNX Runtime sessions must not cross a fork.
+"""
+import multiprocessing as mp
+import os
+import signal
+
+import torch
+
+import generate
+import serve
+from model_pool import DRAFT_MODEL_DIR, get_draft_model, get_model, supports_kv_reuse
+
+
+def memory_mb() -> dict[str, float]:
+    """RSS / PSS / private memory of this process in MB (Linux)."""
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024.0
+    except OSError:
+        return {}
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "private": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def share_weights() -> None:
+    """Load once in the parent and move every parameter into shared memory."""
+    models = [get_model(generate.MODEL_DIR)[1]]
+    if generate.SPECULATIVE and get_draft_model() is not None:
+        models.append(get_model(DRAFT_MODEL_DIR)[1])
+    for model in models:
+        model.share_memory()
+
+
+def _worker(args, threads: int) -> None:
+    torch.set_num_threads(threads)
+    mem = memory_mb()
+    if mem:
+        print(
+            f"[WORKER {os.getpid()}] private {mem['private']:.1f} MB, "
+            f"pss {mem['pss']:.1f} MB, rss {mem['rss']:.1f} MB"
+        )
+    serve.run(args, reuse_port=True)
+
+
+def main():
+    parser = serve.build_parser()
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    serve.configure(args)
+
+    if supports_kv_reuse():
+        share_weights()
+        mem = memory_mb()
+        if mem:
+            print(f"[WORKERS] parent holds the weights: rss {mem['rss']:.1f} MB")
+    else:
+        print("[WORKERS] non-torch backend: each worker loads its own model")
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    ctx = mp.get_context("fork")
+    procs = [
+        ctx.Process(target=_worker, args=(args, threads), name=f"seal-worker-{i}")
+        for i in range(args.workers)
+    ]
+    for p in procs:
+        p.start()
+
+    def _stop(signum, frame):
+        # workers shut down gracefully on SIGTERM (see serve.py)
+        for p in procs:
+            if p.is_alive():
+                os.kill(p.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()